@@ -0,0 +1,73 @@
+"""Measures the time and peak memory of exporting a dataset in every export format.
+
+Each export runs in a fresh process so its peak resident memory can be measured.
+
+Usage: python benchmarks/export_benchmark.py --rows 1000000
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from constants import export_chunk_size  # noqa: E402
+from export import export_data  # noqa: E402
+from generate import make_mhm_frame  # noqa: E402
+
+benchmark_formats = ["convert_df", "csv", "csv.gz", "parquet", "feather"]
+
+
+def max_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_export(export_format, rows, chunk_size, results):
+    df = make_mhm_frame(rows)
+    baseline = max_rss_mb()
+    start = time.perf_counter()
+    with tempfile.TemporaryFile() as f:
+        if export_format == "convert_df":
+            # The previous in-memory implementation, for comparison
+            f.write(df.to_csv().encode("utf-8"))
+        else:
+            export_data(df, f, export_format, chunk_size)
+        size = f.tell()
+    results.put(
+        {
+            "format": export_format,
+            "seconds": round(time.perf_counter() - start, 3),
+            "peak_rss_growth_mb": round(max_rss_mb() - baseline, 1),
+            "size_mb": round(size / 1024**2, 1),
+        }
+    )
+
+
+def benchmark_exports(rows, chunk_size=export_chunk_size, formats=benchmark_formats):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    measurements = []
+    for export_format in formats:
+        process = context.Process(
+            target=run_export, args=(export_format, rows, chunk_size, results)
+        )
+        process.start()
+        measurements.append(results.get())
+        process.join()
+    return pd.DataFrame(measurements)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=export_chunk_size)
+    args = parser.parse_args()
+    print(benchmark_exports(args.rows, args.chunk_size).to_string(index=False))
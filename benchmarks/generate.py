@@ -0,0 +1,105 @@
+"""Generates synthetic GLOBE-like Mosquito Habitat Mapper and Land Cover datasets.
+
+The columns follow the naming of the cleaned GLOBE data the dashboard works with,
+including list-valued GLOBE team columns, invalid coordinates and duplicate
+observations, so every filter and cleanup stage has work to do.
+"""
+import numpy as np
+import pandas as pd
+
+water_sources = ["pond", "lake", "container", "puddle", "tire", "stream"]
+genera = ["Aedes", "Anopheles", "Culex", "Other", None]
+classifications = [
+    "Barren, Bare Rock",
+    "Urban, Residential Property",
+    "Trees, Closely Spaced, Deciduous - Broad Leaved",
+    "Herbaceous/Grassland, Short Grass",
+    "Open Water, Lake",
+]
+
+
+def make_teams(rng, count=500):
+    # Team lists are shared between rows, so 10M rows only hold `count` lists
+    teams = [f"SEES{year}" for year in range(2018, 2023)] + [
+        f"Team{i}" for i in range(200)
+    ]
+    return [
+        [
+            str(team)
+            for team in rng.choice(teams, size=rng.integers(0, 4), replace=False)
+        ]
+        for _ in range(count)
+    ]
+
+
+def make_coordinates(rng, rows, prefix, duplicate_ratio=0.05, invalid_ratio=0.01):
+    latitudes = rng.uniform(-60, 70, rows).round(4)
+    longitudes = rng.uniform(-180, 180, rows).round(4)
+    # Repeat some observations to exercise the duplicate filter
+    duplicates = rng.random(rows) < duplicate_ratio
+    sources = rng.integers(0, rows, duplicates.sum())
+    latitudes[duplicates] = latitudes[sources]
+    longitudes[duplicates] = longitudes[sources]
+    latitudes[rng.random(rows) < invalid_ratio] = -9999
+    return {
+        f"{prefix}_Latitude": latitudes,
+        f"{prefix}_Longitude": longitudes,
+        # Poor geolocation: the MGRS coordinates match the truncated coordinates
+        f"{prefix}_MGRSLatitude": np.where(
+            rng.random(rows) < 0.1, np.trunc(latitudes), latitudes + 0.001
+        ),
+        f"{prefix}_MGRSLongitude": np.where(
+            rng.random(rows) < 0.1, np.trunc(longitudes), longitudes + 0.001
+        ),
+    }
+
+
+def make_dates(rng, rows):
+    return pd.Timestamp("2017-05-31") + pd.to_timedelta(
+        rng.integers(0, 1700, rows), unit="D"
+    )
+
+
+def make_mhm_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    teams = make_teams(rng)
+    return pd.DataFrame.from_dict(
+        {
+            "mhm_measuredDate": make_dates(rng, rows),
+            **make_coordinates(rng, rows, "mhm"),
+            "mhm_elevation": rng.uniform(0, 3000, rows).round(1),
+            "mhm_siteName": rng.integers(0, rows // 10 + 1, rows).astype(str),
+            "mhm_WaterSource": rng.choice(water_sources, rows).astype(object),
+            "mhm_Genus": rng.choice(genera, rows),
+            "mhm_LarvaeCount": rng.integers(-1, 100, rows).astype(np.float64),
+            "mhm_HasEggs": rng.random(rows) < 0.3,
+            "mhm_PhotoCount": rng.integers(0, 4, rows),
+            "mhm_GLOBETeams": [teams[i] for i in rng.integers(0, len(teams), rows)],
+            "mhm_CumulativeCompletenessScore": rng.random(rows).round(2),
+            "mhm_SubCompletenessScore": rng.random(rows).round(2),
+        }
+    )
+
+
+def make_lc_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    teams = make_teams(rng)
+    return pd.DataFrame.from_dict(
+        {
+            "lc_measuredDate": make_dates(rng, rows),
+            **make_coordinates(rng, rows, "lc"),
+            "lc_PrimaryClassification": rng.choice(classifications, rows).astype(
+                object
+            ),
+            "lc_PrimaryPercentage": rng.integers(0, 101, rows).astype(np.float64),
+            "lc_SubCompletenessScore": rng.random(rows).round(2),
+            "lc_ClassificationCount": rng.integers(0, 6, rows).astype(np.float64),
+            "lc_PhotoCount": rng.integers(0, 7, rows).astype(np.float64),
+            "lc_SnowIce": rng.random(rows) < 0.05,
+            "lc_WaterSource": rng.choice(water_sources, rows).astype(object),
+            "lc_GLOBETeams": [teams[i] for i in rng.integers(0, len(teams), rows)],
+        }
+    )
+
+
+generators = {"mhm": make_mhm_frame, "lc": make_lc_frame}
@@ -0,0 +1,261 @@
+"""Measures how the dashboard's data operations scale with the size of the data.
+
+Every operation runs on synthetic Mosquito Habitat Mapper and Land Cover data (see
+generate.py). The time is the best of several runs and the peak memory is the
+largest amount of memory traced by tracemalloc during one run. Results can be saved
+as JSON and compared against the results of another commit.
+
+Only the public entry points the dashboard has always had (apply_filters,
+apply_cleanup_filters and download_data) are called, so the same suite runs on older
+commits. Caches added later are cleared before each run when they exist.
+
+Usage:
+    python benchmarks/suite.py --rows 10000 100000 1000000 --output results.json
+    python benchmarks/suite.py --compare results.json
+    python benchmarks/suite.py --download 2022-01-01 2022-01-31
+"""
+import argparse
+import inspect
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from functools import partial
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+import utils  # noqa: E402
+from generate import generators  # noqa: E402
+from utils import (  # noqa: E402
+    apply_cleanup_filters,
+    apply_filters,
+    download_data,
+    numeric_filter,
+    value_filter,
+)
+
+try:
+    from indexing import index_cache
+except ImportError:  # commits without inverted indexes
+    index_cache = None
+
+# GLOBE protocol downloaded for each synthetic dataset
+download_protocols = {"mhm": "mosquito_habitat_mapper", "lc": "land_covers"}
+
+default_rows = [10_000, 100_000, 1_000_000]
+# Relative slowdown / memory growth reported as a regression
+time_threshold = 0.25
+memory_threshold = 0.10
+# Differences below these are noise
+min_seconds = 0.005
+min_mb = 1.0
+
+
+def operations(prefix):
+    filters = {
+        "latitude": partial(numeric_filter, ">", 0, f"{prefix}_Latitude"),
+        "water source": partial(
+            value_filter, ["pond", "lake"], False, f"{prefix}_WaterSource"
+        ),
+        "teams": partial(
+            value_filter, ["SEES2020", "Team1"], True, f"{prefix}_GLOBETeams"
+        ),
+    }
+    return {
+        "numeric_filter": lambda df: apply_filters(df, filters, ["latitude"]),
+        "value_filter": lambda df: apply_filters(df, filters, ["water source"]),
+        "value_filter (teams)": lambda df: apply_filters(df, filters, ["teams"]),
+        "apply_filters": lambda df: apply_filters(df, filters, list(filters)),
+        "apply_cleanup_filters": partial(
+            apply_cleanup_filters,
+            poor_geolocation_filter=True,
+            valid_coords_filter=True,
+            duplicate_filter=True,
+            duplicate_filter_cols=[
+                f"{prefix}_Latitude",
+                f"{prefix}_Longitude",
+                f"{prefix}_measuredDate",
+                f"{prefix}_WaterSource",
+            ],
+            duplicate_filter_size=2,
+        ),
+    }
+
+
+def download_operation(protocol, start_date, end_date):
+    download_args = {
+        "protocol": download_protocols[protocol],
+        "start_date": start_date,
+        "end_date": end_date,
+        "countries": [],
+        "regions": [],
+    }
+    options = {}
+    if "cache" in inspect.signature(download_data).parameters:
+        # Measure the download itself rather than the on-disk dataset cache
+        options["cache"] = None
+
+    def download(_df):
+        return download_data(dict(download_args), **options)
+
+    return download
+
+
+def reset_caches():
+    # Every run starts cold, as after a new download
+    if index_cache is not None:
+        index_cache.invalidate()
+    predicate = getattr(utils, "compile_numeric_predicate", None)
+    if hasattr(predicate, "cache_clear"):
+        predicate.cache_clear()
+
+
+def measure(operation, df, repeat):
+    times = []
+    for _ in range(repeat):
+        reset_caches()
+        start = time.perf_counter()
+        operation(df)
+        times.append(time.perf_counter() - start)
+    reset_caches()
+    tracemalloc.start()
+    operation(df)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak / 1024**2
+
+
+def record(results, protocol, rows, name, operation, df, repeat):
+    seconds, peak_mb = measure(operation, df, repeat)
+    results.append(
+        {
+            "protocol": protocol,
+            "rows": rows,
+            "operation": name,
+            "seconds": round(seconds, 6),
+            "peak_mb": round(peak_mb, 1),
+        }
+    )
+    print(results[-1], flush=True)
+
+
+def run_suite(
+    rows_list=default_rows, protocols=generators, repeat=3, select=None, download=None
+):
+    results = []
+    for protocol in protocols:
+        for rows in rows_list:
+            df = generators[protocol](rows)
+            for name, operation in operations(protocol).items():
+                if select and name not in select:
+                    continue
+                record(results, protocol, rows, name, operation, df, repeat)
+        if download:
+            # Downloads hit the GLOBE API (or GLOBE_API_URL), so they only run once
+            operation = download_operation(protocol, *download)
+            name = "download_data ({} to {})".format(*download)
+            record(results, protocol, None, name, operation, None, 1)
+    return results
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(
+    results, baseline, time_threshold=time_threshold, memory_threshold=memory_threshold
+):
+    """Finds the measurements that regressed compared to a baseline.
+    Parameters
+    ----------
+    results: list of dict
+        Measurements of run_suite
+    baseline: list of dict
+        Measurements of run_suite on another commit
+    time_threshold: float, default=time_threshold
+        Relative slowdown counted as a regression
+    memory_threshold: float, default=memory_threshold
+        Relative peak memory growth counted as a regression
+    Returns
+    -------
+    list of str
+        Description of every regression. Measurements missing from the baseline are skipped.
+    """
+    previous = {
+        (entry["protocol"], entry["rows"], entry["operation"]): entry
+        for entry in baseline
+    }
+    regressions = []
+    for entry in results:
+        base = previous.get((entry["protocol"], entry["rows"], entry["operation"]))
+        if base is None:
+            continue
+        for metric, threshold, noise in (
+            ("seconds", time_threshold, min_seconds),
+            ("peak_mb", memory_threshold, min_mb),
+        ):
+            if (
+                entry[metric] > base[metric] * (1 + threshold)
+                and entry[metric] - base[metric] > noise
+            ):
+                regressions.append(
+                    f"{entry['operation']} ({entry['protocol']}, {entry['rows']} rows): "
+                    f"{metric} {base[metric]} -> {entry[metric]}"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, nargs="+", default=default_rows)
+    parser.add_argument(
+        "--protocols", nargs="+", choices=list(generators), default=list(generators)
+    )
+    parser.add_argument("--operations", nargs="+", help="only run these operations")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--download",
+        nargs=2,
+        metavar=("START_DATE", "END_DATE"),
+        help="also time download_data for this date range",
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of a baseline run")
+    parser.add_argument("--time-threshold", type=float, default=time_threshold)
+    parser.add_argument("--memory-threshold", type=float, default=memory_threshold)
+    args = parser.parse_args(argv)
+
+    results = run_suite(
+        args.rows, args.protocols, args.repeat, args.operations, args.download
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"commit": current_commit(), "results": results}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(
+            results, baseline["results"], args.time_threshold, args.memory_threshold
+        )
+        for regression in regressions:
+            print("Regression:", regression)
+        return int(bool(regressions))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from constants import cache_dir, cache_max_bytes, cache_storage, cache_ttl
+
+entry_formats = {".parquet", ".feather", ".pkl"}
+storage_formats = {"parquet": ".parquet", "arrow": ".feather"}
+
+
+def dataset_key(protocol, start_date, end_date, countries=[], regions=[]):
+    """Generates the cache key of a GLOBE API request.
+    Parameters
+    ----------
+    protocol: str
+        GLOBE protocol name (e.g. "mosquito_habitat_mapper")
+    start_date: str
+        Start date in the format of YYYY-MM-DD
+    end_date: str
+        End date in the format of YYYY-MM-DD
+    countries: list of str
+        Selected countries
+    regions: list of str
+        Selected regions
+    Returns
+    -------
+    str
+        Hex digest identifying the request. The order of countries and regions is ignored.
+    """
+    request = [protocol, start_date, end_date, sorted(countries), sorted(regions)]
+    return hashlib.sha1(json.dumps(request).encode("utf-8")).hexdigest()
+
+
+def dataset_version(*parts):
+    """Generates the version token of a dataset from the arguments that produced it.
+    Parameters
+    ----------
+    *parts: JSON serializable
+        e.g. the version of the parent dataset and the parameters applied to it
+    Returns
+    -------
+    str
+        Hex digest identifying the dataset. It is computed from the arguments only, so it does not grow with the size of the data.
+    """
+    encoded = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()
+
+
+_frame_versions = {}
+_version_counter = itertools.count()
+
+
+def frame_version(df):
+    """Returns a token identifying a DataFrame object.
+    Parameters
+    ----------
+    df: pd.DataFrame
+        DataFrame
+    Returns
+    -------
+    str
+        Token that stays the same for the lifetime of the object and is never reused. In-place modifications of the DataFrame are not detected.
+    """
+    key = id(df)
+    version = _frame_versions.get(key)
+    if version is None:
+        version = f"frame-{next(_version_counter)}"
+        _frame_versions[key] = version
+        weakref.finalize(df, _frame_versions.pop, key, None)
+    return version
+
+
+def _read_feather(path):
+    # Columns whose Arrow layout matches numpy (e.g. numbers without missing values)
+    # stay read-only views of the mapped file instead of being copied to the heap
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def _restore_lists(df):
+    # Parquet stores list cells (e.g. GLOBE teams) as arrays, convert them back to lists
+    for column in df.columns:
+        if df[column].dtype != object:
+            continue
+        non_null = df[column].dropna()
+        if len(non_null) and isinstance(non_null.iloc[0], np.ndarray):
+            df[column] = df[column].map(
+                lambda entry: entry.tolist() if isinstance(entry, np.ndarray) else entry
+            )
+    return df
+
+
+class DatasetCache:
+    """On-disk cache of downloaded GLOBE datasets.
+
+    Entries are stored as Parquet files named after their key, or as memory-mapped
+    Feather files with the "arrow" storage (frames Arrow cannot represent fall back to
+    pickle). Entries older than `ttl` seconds are treated as misses and the least
+    recently used entries are evicted once the cache grows past `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        directory=cache_dir,
+        ttl=cache_ttl,
+        max_bytes=cache_max_bytes,
+        storage=cache_storage,
+    ):
+        if storage not in storage_formats:
+            raise ValueError(f"Unknown cache storage: {storage}")
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.storage = storage
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if os.path.splitext(name)[1] in entry_formats
+        ]
+
+    def _path(self, key):
+        for extension in entry_formats:
+            path = os.path.join(self.directory, key + extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _read(self, path):
+        if path.endswith(".parquet"):
+            return _restore_lists(pd.read_parquet(path))
+        if path.endswith(".feather"):
+            return _restore_lists(_read_feather(path))
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def get(self, key, ttl=None):
+        """Loads a cached dataset.
+        Parameters
+        ----------
+        key: str
+            Cache key (see dataset_key)
+        ttl: float, default=None
+            Overrides the cache's time to live in seconds for this lookup
+        Returns
+        -------
+        pd.DataFrame or None
+            The cached DataFrame, or None if it is missing or expired.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        path = self._path(key)
+        try:
+            modified = os.path.getmtime(path) if path else None
+            if modified is None or time.time() - modified > ttl:
+                self._count("misses")
+                return None
+            # The access time tracks recency for LRU eviction
+            os.utime(path, (time.time(), modified))
+            df = self._read(path)
+        except OSError:
+            # Entry was evicted by another session in the meantime
+            self._count("misses")
+            return None
+        self._count("hits")
+        return df
+
+    def put(self, key, df):
+        """Stores a dataset and evicts least recently used entries if needed.
+        Parameters
+        ----------
+        key: str
+            Cache key (see dataset_key)
+        df: pd.DataFrame
+            DataFrame to store
+        Returns
+        -------
+        pd.DataFrame
+            The stored DataFrame, loaded memory-mapped from its entry with the "arrow" storage and df itself otherwise
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self.invalidate(key)
+        # Write to a temporary file first so readers never see a partial entry
+        temp_path = os.path.join(self.directory, f".{key}.{threading.get_ident()}.tmp")
+        extension = storage_formats[self.storage]
+        try:
+            if extension == ".feather":
+                # Compressed buffers would have to be decompressed onto the heap
+                df.to_feather(temp_path, compression="uncompressed")
+            else:
+                df.to_parquet(temp_path)
+            path = os.path.join(self.directory, key + extension)
+        except (pa.ArrowException, ValueError):
+            with open(temp_path, "wb") as f:
+                pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+            path = os.path.join(self.directory, key + ".pkl")
+        os.replace(temp_path, path)
+        self.evict(keep=path)
+        if path.endswith(".feather"):
+            # The mapped file stays readable even if the entry is evicted later on
+            return self._read(path)
+        return df
+
+    def invalidate(self, key):
+        """Removes an entry from the cache if present."""
+        path = self._path(key)
+        if path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def evict(self, keep=None):
+        """Removes least recently used entries until the cache fits in max_bytes.
+        Parameters
+        ----------
+        keep: str, default=None
+            Path of an entry that should not be evicted (e.g. the one just written)
+        """
+        entries = []
+        for path in self._entries():
+            try:
+                entries.append((os.path.getatime(path), os.path.getsize(path), path))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self._count("evictions")
+
+    def clear(self):
+        """Removes every entry from the cache."""
+        for path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def size(self):
+        """Returns the total size of the cached entries in bytes."""
+        return sum(os.path.getsize(path) for path in self._entries())
+
+
+class MemoryCache:
+    """Bounded in-memory least recently used cache with hit/miss/eviction counters."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the cached value of key, or None if it is not cached."""
+        with self._lock:
+            if key not in self._entries:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return self._entries[key]
+
+    def put(self, key, value):
+        """Caches a value, evicting the least recently used entries if needed."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached value of key, calling compute() and caching its result on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def invalidate(self, predicate=None):
+        """Removes the entries whose key matches predicate, or every entry if predicate is None."""
+        with self._lock:
+            for key in list(self._entries):
+                if predicate is None or predicate(key):
+                    del self._entries[key]
+
+
+dataset_cache = DatasetCache()
@@ -0,0 +1,190 @@
+"""Replays dashboard metadata JSON files without Streamlit.
+
+Usage: python src/cli.py query1.json query2.json --output-dir out --format parquet
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import dataset_cache, dataset_key
+from constants import download_workers
+from export import export_data, export_writers
+from utils import (
+    apply_cleanup_filters,
+    apply_filters,
+    datetime_to_str,
+    download_data,
+    update_data_args,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def load_query(path):
+    """Reads a metadata JSON file generated by the dashboard.
+    Parameters
+    ----------
+    path: str
+        Path of the metadata JSON file
+    Returns
+    -------
+    tuple of (dict, dict, list, dict)
+        Download arguments, cleanup filters, selected filter names and filter functions of the query
+    """
+    with open(path) as f:
+        metadata = json.load(f)
+    download_args, selected_filters, cleanup_filters, filters = {}, [], {}, {}
+    update_data_args(
+        metadata, download_args, selected_filters, cleanup_filters, filters
+    )
+    for key in ("start_date", "end_date"):
+        download_args[key] = datetime_to_str(download_args[key])
+    return download_args, cleanup_filters, selected_filters, filters
+
+
+def output_paths(paths, output_dir, export_format):
+    """Names the output of every metadata file after the file.
+    Parameters
+    ----------
+    paths: list of str
+        Paths of the metadata JSON files
+    output_dir: str
+        Directory the datasets are written to
+    export_format: str
+        File extension of the outputs
+    Returns
+    -------
+    dict
+        Maps every metadata file to its output path. Files with the same name in different directories get a numbered suffix (e.g. mhm-2.csv), so no output overwrites another.
+    """
+    destinations, used = {}, set()
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        candidate, number = name, 1
+        while candidate in used:
+            number += 1
+            candidate = f"{name}-{number}"
+        used.add(candidate)
+        destinations[path] = os.path.join(output_dir, f"{candidate}.{export_format}")
+    return destinations
+
+
+def process_query(query, data, destination, export_format):
+    """Applies the cleanup and filters of a query to its data and exports the result."""
+    _, cleanup_filters, selected_filters, filters = query
+    cleaned = apply_cleanup_filters(data, **cleanup_filters)
+    filtered = apply_filters(cleaned, filters, selected_filters)
+    # Write to a temporary file first so a failed run never leaves a partial output
+    handle, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(destination) or ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(handle, "wb") as f:
+            export_data(filtered, f, export_format)
+        os.replace(temp_path, destination)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return len(filtered)
+
+
+def run_batch(
+    paths,
+    output_dir,
+    export_format="csv",
+    jobs=download_workers,
+    cache=dataset_cache,
+    refresh=False,
+):
+    """Regenerates the datasets described by metadata JSON files.
+    Parameters
+    ----------
+    paths: list of str
+        Paths of the metadata JSON files
+    output_dir: str
+        Directory the datasets are written to, named after their metadata file (see output_paths)
+    export_format: str, default="csv"
+        One of "csv", "csv.gz", "parquet" or "feather"
+    jobs: int, default=download_workers
+        Number of files processed concurrently
+    cache: DatasetCache, default=dataset_cache
+        On-disk cache of downloaded datasets. Caching is disabled if None.
+    refresh: bool, default=False
+        Whether to download all of the data again
+    Returns
+    -------
+    dict
+        Maps every metadata file to the number of exported rows, or to the exception that made it fail. Files requesting the same protocol, dates and countries share a single download.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    destinations = output_paths(paths, output_dir, export_format)
+    queries, results = {}, {}
+    for path in paths:
+        try:
+            queries[path] = load_query(path)
+        except (OSError, ValueError, KeyError) as error:
+            results[path] = error
+
+    # Downloads and processing use separate pools, so files waiting for a shared
+    # download never hold up the download itself
+    with ThreadPoolExecutor(max(1, jobs)) as downloader, ThreadPoolExecutor(
+        max(1, jobs)
+    ) as processor:
+        downloads = {}
+        for query in queries.values():
+            key = dataset_key(**query[0])
+            if key not in downloads:
+                downloads[key] = downloader.submit(
+                    download_data, dict(query[0]), cache, refresh
+                )
+
+        def process(path):
+            query = queries[path]
+            data = downloads[dataset_key(**query[0])].result()
+            return process_query(query, data, destinations[path], export_format)
+
+        futures = {path: processor.submit(process, path) for path in queries}
+        for path, future in futures.items():
+            try:
+                results[path] = future.result()
+                logger.info("%s: exported %d rows", path, results[path])
+            except Exception as error:
+                logger.error("%s: %s", path, error)
+                results[path] = error
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Regenerates GLOBE datasets from dashboard metadata JSON files."
+    )
+    parser.add_argument("metadata", nargs="+", help="metadata JSON files")
+    parser.add_argument("--output-dir", "-o", default=".")
+    parser.add_argument("--format", default="csv", choices=list(export_writers))
+    parser.add_argument("--jobs", "-j", type=int, default=download_workers)
+    parser.add_argument(
+        "--refresh", action="store_true", help="ignore cached downloads"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="do not read or write the cache"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    results = run_batch(
+        args.metadata,
+        args.output_dir,
+        args.format,
+        args.jobs,
+        None if args.no_cache else dataset_cache,
+        args.refresh,
+    )
+    return int(any(isinstance(result, Exception) for result in results.values()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,5 @@
+import os
+
 protocols = {
     "Mosquito Habitat Mapper": "mosquito_habitat_mapper",
     "Land Cover": "land_covers",
@@ -23,3 +25,92 @@ default_cleanup_dict = {
     "duplicate_filter_cols": [],
     "duplicate_filter_size": 2,
 }
+
+# On-disk dataset cache (see cache.py)
+cache_dir = os.environ.get(
+    "GLOBE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "globe-data-dashboard"),
+)
+cache_ttl = int(os.environ.get("GLOBE_CACHE_TTL", 24 * 60 * 60))  # seconds
+cache_max_bytes = int(os.environ.get("GLOBE_CACHE_MAX_BYTES", 2 * 1024**3))
+# "arrow" stores datasets as uncompressed Feather files that are loaded memory-mapped,
+# so sessions and worker processes share them through the OS page cache
+cache_storage = os.environ.get("GLOBE_CACHE_STORAGE", "parquet")
+
+# String columns with at most this ratio of distinct values are stored as categoricals
+category_max_ratio = 0.05
+
+# Number of filter masks kept per session (see utils.apply_filters)
+mask_cache_size = 256
+
+# Use the vectorized cleanup filters in utils.py instead of the go_utils ones
+native_cleanup = os.environ.get("GLOBE_NATIVE_CLEANUP", "1") != "0"
+
+# Number of cleanup stage masks and positions kept per session (see utils.cleanup_positions)
+cleanup_cache_size = 64
+
+# Number of exports (and metadata JSON files) kept per session
+export_cache_size = 8
+
+# Number of rendered diagnostic plot sets kept per session (see plotting.py)
+plot_cache_size = 4
+
+# Paginated data table (see table.py)
+table_page_sizes = [100, 250, 500]  # rows
+table_cache_size = 8  # sort orders kept per session
+
+# Per-stage timing and memory spans (see profiling.py)
+profiling_enabled = os.environ.get("GLOBE_PROFILING", "1") != "0"
+profiling_log = os.environ.get("GLOBE_PROFILING_LOG", "0") != "0"  # JSON log records
+
+# Number of per-dataset column indexes kept in memory (see indexing.py)
+index_cache_size = 32
+
+# Cell size of the spatial grid index in degrees (see indexing.GridIndex)
+spatial_cell_size = 1.0
+
+# Map rendering (see mapping.py)
+map_point_budget = 5_000  # maximum number of markers, denser data is shown as a heatmap
+map_cell_size = 0.01  # degrees, finest grid used to aggregate points
+map_cache_size = 4
+
+# Raster tiles of the observations (see tiles.py), served by Streamlit's static file
+# serving from the static folder next to main.py
+tile_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "tiles")
+tile_url = "/app/static/tiles"
+tile_size = 256  # pixels
+tile_max_zoom = 7  # deeper zoom levels upscale the tiles of this level
+tile_saturation = 50  # observations per pixel drawn fully opaque
+tile_color = (214, 39, 40)  # RGB
+tile_max_age = 24 * 60 * 60  # seconds
+
+# Streaming exports (see export.py)
+export_dir = os.path.join(cache_dir, "exports")
+export_chunk_size = 100_000  # rows
+export_max_age = 24 * 60 * 60  # seconds
+# st.download_button reads the whole file into memory, larger exports are only
+# available through the batch CLI (see cli.py)
+export_max_serve_bytes = int(
+    os.environ.get("GLOBE_EXPORT_MAX_SERVE_BYTES", 200 * 1024**2)
+)
+
+# GLOBE API endpoint used for downloads (see fetching.py). Point GLOBE_API_URL at a
+# stand-in (see standin.py) to work offline.
+globe_api_upstream = (
+    "https://api.globe.gov/search/v1/measurement/protocol/measureddate/"
+)
+globe_api_url = os.environ.get("GLOBE_API_URL", globe_api_upstream)
+measured_date_col = "measuredDate"
+partition_freq = "M"  # pandas period frequency of a partition
+recent_partition_days = 31  # partitions ending within this window may still change
+recent_partition_ttl = 60 * 60  # seconds
+download_workers = int(os.environ.get("GLOBE_DOWNLOAD_WORKERS", 4))
+download_retries = 3
+# A stalled request raises requests.Timeout and is retried like any other failure
+request_timeout = float(os.environ.get("GLOBE_REQUEST_TIMEOUT", 60))  # seconds
+retry_backoff = 1.0  # seconds, doubled after every failed attempt
+download_poll_interval = 0.5  # seconds between reruns showing a background download
+
+# Local GLOBE API stand-in (see standin.py)
+standin_dir = os.path.join(cache_dir, "recordings")
+standin_port = 8765
@@ -0,0 +1,150 @@
+import gzip
+import json
+import os
+import time
+import uuid
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from constants import export_chunk_size, export_dir, export_max_age
+from views import RowView, restore_dtypes
+
+export_formats = {
+    "CSV": ("csv", "text/csv"),
+    "Gzipped CSV": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Feather": ("feather", "application/vnd.apache.arrow.file"),
+}
+
+
+def iter_chunks(df, chunk_size=export_chunk_size):
+    # Chunks are exported with their original dtypes, as if df was not optimized.
+    # The rows of a view are copied one chunk at a time.
+    for start in range(0, max(len(df), 1), chunk_size):
+        rows = slice(start, start + chunk_size)
+        chunk = df.take(rows) if isinstance(df, RowView) else df.iloc[rows]
+        yield restore_dtypes(chunk)
+
+
+def export_schema(df):
+    # The schema the exported chunks have with their original dtypes. Column types are
+    # inferred from every row since a column can be empty in the first chunk, and
+    # columns are restored one at a time, so only a single column is copied.
+    if isinstance(df, RowView):
+        frame, index_frame = df.data, df.take(slice(0, 0)).iloc[:, :0]
+    else:
+        frame, index_frame = df, df.iloc[:, :0]
+    schema = pa.Schema.from_pandas(index_frame)
+    metadata = json.loads(schema.metadata[b"pandas"])
+    fields, columns = [], []
+    for column in frame.columns:
+        column_schema = pa.Schema.from_pandas(
+            restore_dtypes(frame[[column]]), preserve_index=False
+        )
+        fields.append(column_schema.field(0))
+        columns.append(json.loads(column_schema.metadata[b"pandas"])["columns"][0])
+    metadata["columns"] = columns + metadata["columns"]
+    metadata["column_indexes"] = json.loads(
+        pa.Schema.from_pandas(frame.iloc[:0]).metadata[b"pandas"]
+    )["column_indexes"]
+    # The report of utils.optimize_dtypes describes the dashboard, not the data
+    metadata.get("attributes", {}).pop("memory_report", None)
+    return pa.schema(
+        fields + list(schema),
+        metadata={**schema.metadata, b"pandas": json.dumps(metadata).encode("utf-8")},
+    )
+
+
+def write_csv(df, file, chunk_size=export_chunk_size):
+    for number, chunk in enumerate(iter_chunks(df, chunk_size)):
+        file.write(chunk.to_csv(header=number == 0).encode("utf-8"))
+
+
+def write_gzip_csv(df, file, chunk_size=export_chunk_size):
+    with gzip.GzipFile(fileobj=file, mode="wb") as gzip_file:
+        write_csv(df, gzip_file, chunk_size)
+
+
+def write_parquet(df, file, chunk_size=export_chunk_size):
+    schema = export_schema(df)
+    with pq.ParquetWriter(file, schema) as writer:
+        for chunk in iter_chunks(df, chunk_size):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema))
+
+
+def write_feather(df, file, chunk_size=export_chunk_size):
+    schema = export_schema(df)
+    options = pa.ipc.IpcWriteOptions(compression="lz4")
+    with pa.ipc.new_file(file, schema, options=options) as writer:
+        for chunk in iter_chunks(df, chunk_size):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema))
+
+
+export_writers = {
+    "csv": write_csv,
+    "csv.gz": write_gzip_csv,
+    "parquet": write_parquet,
+    "feather": write_feather,
+}
+
+
+def export_data(df, file, export_format="csv", chunk_size=export_chunk_size):
+    """Writes a dataset to a binary file object in row chunks.
+    Parameters
+    ----------
+    df: pd.DataFrame or views.RowView
+        Data to export, the rows of a view are copied one chunk at a time
+    file: file object
+        Binary file object to write to
+    export_format: str, default="csv"
+        One of "csv", "csv.gz", "parquet" or "feather"
+    chunk_size: int, default=export_chunk_size
+        Number of rows converted at a time, which bounds the memory used by the export
+    """
+    if export_format not in export_writers:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    export_writers[export_format](df, file, chunk_size)
+
+
+def remove_old_exports(directory=export_dir, max_age=export_max_age):
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if time.time() - os.path.getmtime(path) > max_age:
+                os.remove(path)
+        except OSError:
+            continue
+
+
+def export_to_file(
+    df, export_format="csv", directory=export_dir, chunk_size=export_chunk_size
+):
+    """Exports a dataset to a new file on disk.
+    Parameters
+    ----------
+    df: pd.DataFrame or views.RowView
+        Data to export, the rows of a view are copied one chunk at a time
+    export_format: str, default="csv"
+        One of "csv", "csv.gz", "parquet" or "feather"
+    directory: str, default=export_dir
+        Directory of the exported files. Exports older than export_max_age are removed.
+    chunk_size: int, default=export_chunk_size
+        Number of rows converted at a time
+    Returns
+    -------
+    str
+        Path of the exported file
+    """
+    os.makedirs(directory, exist_ok=True)
+    remove_old_exports(directory)
+    path = os.path.join(directory, f"{uuid.uuid4().hex}.{export_format}")
+    try:
+        with open(path, "wb") as f:
+            export_data(df, f, export_format, chunk_size)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
@@ -0,0 +1,281 @@
+import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from go_utils.download import (
+    convert_dates_to_datetime,
+    default_data_clean,
+    parse_api_data,
+)
+
+from cache import dataset_key
+from constants import (
+    date_fmt,
+    download_retries,
+    download_workers,
+    globe_api_url,
+    measured_date_col,
+    partition_freq,
+    recent_partition_days,
+    recent_partition_ttl,
+    request_timeout,
+    retry_backoff,
+)
+
+
+class DownloadCancelled(Exception):
+    """Raised when a download is cancelled before it finished."""
+
+
+class ServerError(RuntimeError):
+    """Raised when the GLOBE API fails with a 5xx response, which may succeed when retried."""
+
+
+def partition_date_range(start_date, end_date, freq=partition_freq):
+    """Splits a date range into fixed calendar partitions.
+    Parameters
+    ----------
+    start_date: str
+        Start date in the format of YYYY-MM-DD
+    end_date: str
+        End date in the format of YYYY-MM-DD
+    freq: str, default=partition_freq
+        pandas period frequency of a partition (e.g. "M" for months)
+    Returns
+    -------
+    list of tuple of str
+        (start, end) dates of every partition overlapping the range. Partitions always span whole periods so they can be reused by other date ranges.
+    """
+    periods = pd.period_range(
+        pd.Timestamp(start_date).to_period(freq),
+        pd.Timestamp(end_date).to_period(freq),
+        freq=freq,
+    )
+    return [
+        (period.start_time.strftime(date_fmt), period.end_time.strftime(date_fmt))
+        for period in periods
+    ]
+
+
+def is_recent_partition(partition_end, today=None):
+    """Checks whether a partition is recent enough that GLOBE may still add observations to it."""
+    today = today or datetime.date.today()
+    cutoff = today - datetime.timedelta(days=recent_partition_days)
+    return datetime.datetime.strptime(partition_end, date_fmt).date() >= cutoff
+
+
+def is_recent_range(start_date, end_date, today=None):
+    """Checks whether a date range overlaps a recent partition (see is_recent_partition)."""
+    _, last_partition_end = partition_date_range(start_date, end_date)[-1]
+    return is_recent_partition(last_partition_end, today)
+
+
+def partition_key(protocol, start_date, end_date):
+    return "partition-" + dataset_key(protocol, start_date, end_date)
+
+
+def fetch_raw_data(protocol, start_date, end_date, api_url=None):
+    """Downloads uncleaned GLOBE data for a date range.
+    Parameters
+    ----------
+    protocol: str
+        GLOBE protocol name (e.g. "mosquito_habitat_mapper")
+    start_date: str
+        Start date in the format of YYYY-MM-DD
+    end_date: str
+        End date in the format of YYYY-MM-DD
+    api_url: str, default=None
+        GLOBE API measurement endpoint, globe_api_url if None
+    Returns
+    -------
+    pd.DataFrame
+        Raw GLOBE data with converted dates. Empty if there are no observations in the range.
+    """
+    # Looked up on every call, so tests can point the downloads at a stand-in
+    response = requests.get(
+        api_url or globe_api_url,
+        params={
+            "protocols": protocol,
+            "startdate": start_date,
+            "enddate": end_date,
+            "geojson": "FALSE",
+            "sample": "FALSE",
+        },
+        timeout=request_timeout,
+    )
+    if not response:
+        error = ServerError if response.status_code >= 500 else RuntimeError
+        raise error(
+            "Failed to get data from the API. Double check your specified settings to make sure they are valid."
+        )
+    response_json = response.json()
+    if not response_json.get("results", True):
+        return pd.DataFrame()
+    df = parse_api_data(response_json)
+    convert_dates_to_datetime(df)
+    df.attrs["response_bytes"] = len(response.content)
+    return df
+
+
+def trim_to_date_range(df, start_date, end_date):
+    # Partitions span whole periods, so the first and last ones can exceed the range
+    if df.empty:
+        return df
+    dates = df[measured_date_col]
+    mask = ~(dates < pd.Timestamp(start_date)) & ~(dates > pd.Timestamp(end_date))
+    return df if mask.all() else df[mask]
+
+
+def merge_partitions(frames, protocol):
+    """Concatenates raw partitions in order and applies the default GLOBE cleanup once."""
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        raise RuntimeError("No GLOBE observations were found for the given date range.")
+    # Columns that are empty in some partitions get object dtype, infer_objects
+    # restores the dtype a single download would have had.
+    data = pd.concat(frames, ignore_index=True).infer_objects()
+    return default_data_clean(data, protocol)
+
+
+def fetch_partition(
+    protocol, start_date, end_date, api_url=None, retries=download_retries
+):
+    """Downloads a raw partition, retrying timeouts, connection errors and 5xx responses with exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            return fetch_raw_data(protocol, start_date, end_date, api_url)
+        except (requests.Timeout, requests.ConnectionError, ServerError):
+            if attempt == retries:
+                raise
+            time.sleep(retry_backoff * 2**attempt)
+
+
+def fetch_whole_range(
+    protocol, start_date, end_date, api_url=None, progress=None, cancel=None
+):
+    """Downloads a date range in a single request, reported as a single partition.
+    Parameters
+    ----------
+    protocol: str
+        GLOBE protocol name (e.g. "mosquito_habitat_mapper")
+    start_date: str
+        Start date in the format of YYYY-MM-DD
+    end_date: str
+        End date in the format of YYYY-MM-DD
+    api_url: str, default=None
+        GLOBE API measurement endpoint, globe_api_url if None
+    progress: callable, default=None
+        Called as progress(completed, total, rows, nbytes) before and after the request (see fetch_partitioned_data)
+    cancel: threading.Event, default=None
+        The request is not started once it is set and DownloadCancelled is raised
+    Returns
+    -------
+    pd.DataFrame
+        Cleaned GLOBE data of the date range, the same as go_utils.get_api_data
+    """
+    if cancel is not None and cancel.is_set():
+        raise DownloadCancelled()
+    if progress is not None:
+        progress(0, 1, 0, 0)
+    df = fetch_partition(protocol, start_date, end_date, api_url)
+    if progress is not None:
+        progress(1, 1, len(df), df.attrs.get("response_bytes", 0))
+    return merge_partitions([df], protocol)
+
+
+def cached_partitions(protocol, partitions, cache, refresh, refresh_recent):
+    """Loads the cached raw partitions, with None for partitions that have to be downloaded."""
+    frames = [None] * len(partitions)
+    if cache is None:
+        return frames
+    for index, (partition_start, partition_end) in enumerate(partitions):
+        recent = is_recent_partition(partition_end)
+        if not (refresh or (recent and refresh_recent)):
+            frames[index] = cache.get(
+                partition_key(protocol, partition_start, partition_end),
+                ttl=recent_partition_ttl if recent else float("inf"),
+            )
+    return frames
+
+
+def fetch_partitioned_data(
+    protocol,
+    start_date,
+    end_date,
+    cache=None,
+    refresh=False,
+    refresh_recent=False,
+    workers=download_workers,
+    api_url=None,
+    progress=None,
+    cancel=None,
+):
+    """Downloads GLOBE data partition by partition, only fetching partitions missing from the cache.
+    Parameters
+    ----------
+    protocol: str
+        GLOBE protocol name (e.g. "mosquito_habitat_mapper")
+    start_date: str
+        Start date in the format of YYYY-MM-DD
+    end_date: str
+        End date in the format of YYYY-MM-DD
+    cache: DatasetCache, default=None
+        Cache holding the raw partitions. Every partition is downloaded if None.
+    refresh: bool, default=False
+        Whether to download every partition again
+    refresh_recent: bool, default=False
+        Whether to download partitions that may still change again. Historic partitions never expire.
+    workers: int, default=download_workers
+        Number of partitions downloaded concurrently
+    api_url: str, default=None
+        GLOBE API measurement endpoint, globe_api_url if None
+    progress: callable, default=None
+        Called as progress(completed, total, rows, nbytes) after every partition with the number of completed partitions, their total and the rows and response bytes of the partition
+    cancel: threading.Event, default=None
+        Partitions are no longer downloaded once it is set and DownloadCancelled is raised
+    Returns
+    -------
+    pd.DataFrame
+        Cleaned GLOBE data of the whole date range. Partitions are merged in date order, so the output does not depend on the number of workers.
+    """
+    partitions = partition_date_range(start_date, end_date)
+    frames = cached_partitions(protocol, partitions, cache, refresh, refresh_recent)
+
+    def download(partition):
+        if cancel is not None and cancel.is_set():
+            raise DownloadCancelled()
+        df = fetch_partition(protocol, *partition, api_url)
+        # Cache as soon as possible so a failed partition does not discard the others
+        if cache is not None:
+            cache.put(partition_key(protocol, *partition), df)
+        return df
+
+    completed = 0
+
+    def report(df, nbytes):
+        nonlocal completed
+        completed += 1
+        if progress is not None:
+            progress(completed, len(frames), len(df), nbytes)
+
+    for df in frames:
+        if df is not None:
+            report(df, 0)
+
+    missing = [index for index, df in enumerate(frames) if df is None]
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        futures = {
+            index: executor.submit(download, partitions[index]) for index in missing
+        }
+        for index, future in futures.items():
+            frames[index] = future.result()
+            report(frames[index], frames[index].attrs.get("response_bytes", 0))
+    finally:
+        # Drop the partitions that have not started yet if a partition failed
+        executor.shutdown(cancel_futures=True)
+
+    frames = [trim_to_date_range(df, start_date, end_date) for df in frames]
+    return merge_partitions(frames, protocol)
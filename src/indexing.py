@@ -0,0 +1,263 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_hashable
+
+from cache import MemoryCache, frame_version
+from constants import index_cache_size, spatial_cell_size
+
+index_cache = MemoryCache(index_cache_size)
+
+
+class InvertedIndex:
+    """Index of a list-valued data column (e.g. GLOBE teams).
+
+    Maps every value appearing in the lists to the sorted row positions of the lists
+    containing it, so include/exclude filters reduce to a union of position arrays.
+    """
+
+    def __init__(self, series):
+        entries = series.to_numpy()
+        self.length = len(entries)
+        self.is_list = ~np.fromiter(
+            map(is_hashable, entries), dtype=bool, count=self.length
+        )
+
+        positions = np.flatnonzero(self.is_list)
+        exploded = pd.Series(entries[positions], index=positions).explode().dropna()
+        codes, uniques = pd.factorize(exploded)
+        rows = exploded.index.to_numpy(dtype=np.int64)
+
+        # Group rows by value and drop values listed twice in the same row
+        order = np.lexsort((rows, codes))
+        codes, rows = codes[order], rows[order]
+        unique_pairs = np.ones(len(rows), dtype=bool)
+        unique_pairs[1:] = (codes[1:] != codes[:-1]) | (rows[1:] != rows[:-1])
+        codes, rows = codes[unique_pairs], rows[unique_pairs]
+        splits = np.flatnonzero(np.diff(codes)) + 1
+        self.postings = dict(zip(uniques, np.split(rows.astype(np.int32), splits)))
+
+    @property
+    def values(self):
+        """Every distinct value appearing in the lists."""
+        return list(self.postings)
+
+    def values_in(self, positions):
+        """Lists the distinct values appearing in the lists of the given rows (e.g. the rows kept by the cleanup)."""
+        selected = np.zeros(self.length, dtype=bool)
+        selected[positions] = True
+        return [value for value, rows in self.postings.items() if selected[rows].any()]
+
+    def positions(self, values):
+        """Returns the sorted positions of the rows whose list contains any of the given values."""
+        matches = [self.postings[value] for value in values if value in self.postings]
+        if not matches:
+            return np.empty(0, dtype=np.int32)
+        if len(matches) == 1:
+            return matches[0]
+        return np.unique(np.concatenate(matches))
+
+    def mask(self, values, exclude=False):
+        """Filters the indexed column by the presence of given values in each list.
+        Parameters
+        ----------
+        values: list
+            List of desired or unwanted list entries
+        exclude: bool, default=False
+            boolean indicating whether to include or exclude values
+        Returns
+        -------
+        ndarray
+            1D Boolean array mask. Matches go_utils.filtering.filter_by_globe_team: entries that are not lists never match unless values is empty and exclude is True.
+        """
+        if exclude and not values:
+            return np.full(self.length, True)
+        matched = self.positions(values)
+        if exclude:
+            mask = self.is_list.copy()
+            mask[matched] = False
+        else:
+            mask = np.full(self.length, False)
+            mask[matched] = True
+        return mask
+
+
+def get_inverted_index(df, column):
+    """Returns the inverted index of a list-valued column, building it once per DataFrame.
+    Parameters
+    ----------
+    df: pd.DataFrame
+        DataFrame
+    column: str
+        String for column name
+    Returns
+    -------
+    InvertedIndex
+        Index shared by every filter and widget using the column of this DataFrame
+    """
+    key = ("inverted", frame_version(df), column)
+    index = index_cache.get(key)
+    if index is None:
+        index = InvertedIndex(df[column])
+        index_cache.put(key, index)
+    return index
+
+
+def points_in_polygon(latitudes, longitudes, vertices):
+    """Checks which points lie inside a polygon using the even-odd rule.
+    Parameters
+    ----------
+    latitudes: np.ndarray
+        Latitudes of the points
+    longitudes: np.ndarray
+        Longitudes of the points
+    vertices: list of [float, float]
+        [latitude, longitude] vertices of the polygon, the last vertex is connected to the first
+    Returns
+    -------
+    ndarray
+        1D Boolean array indicating which points are inside the polygon
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    inside = np.full(len(latitudes), False)
+    for (lat1, lon1), (lat2, lon2) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        # Count the edges crossed by a ray going east from every point
+        spans = (lat1 > latitudes) != (lat2 > latitudes)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            crossing = lon1 + (latitudes - lat1) * (lon2 - lon1) / (lat2 - lat1)
+        inside ^= spans & (longitudes < crossing)
+    return inside
+
+
+class GridIndex:
+    """Spatial index of observation coordinates.
+
+    Buckets the rows into a regular latitude/longitude grid, so bounding box and
+    polygon filters only test the rows of the cells they overlap instead of every row.
+    """
+
+    def __init__(self, latitudes, longitudes, cell_size=spatial_cell_size):
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.length = len(self.latitudes)
+        self.cell_size = cell_size
+        self.rows = int(np.ceil(180 / cell_size))
+        self.cols = int(np.ceil(360 / cell_size))
+
+        # Invalid coordinates are left out of the index and never match
+        located = np.flatnonzero(
+            (np.abs(self.latitudes) <= 90) & (np.abs(self.longitudes) <= 180)
+        )
+        cells = self._row(self.latitudes[located]) * self.cols + self._col(
+            self.longitudes[located]
+        )
+        order = np.argsort(cells, kind="stable")
+        self.positions = located[order]
+        self.offsets = np.searchsorted(
+            cells[order], np.arange(self.rows * self.cols + 1)
+        )
+
+    def _row(self, latitudes):
+        rows = np.floor((np.asarray(latitudes) + 90) / self.cell_size)
+        return np.clip(rows, 0, self.rows - 1).astype(np.int64)
+
+    def _col(self, longitudes):
+        cols = np.floor((np.asarray(longitudes) + 180) / self.cell_size)
+        return np.clip(cols, 0, self.cols - 1).astype(np.int64)
+
+    def candidates(self, min_lat, min_lon, max_lat, max_lon):
+        """Returns the positions of the rows in the cells overlapping a bounding box."""
+        if min_lon > max_lon:
+            # The box crosses the antimeridian
+            return np.concatenate(
+                [
+                    self.candidates(min_lat, min_lon, max_lat, 180),
+                    self.candidates(min_lat, -180, max_lat, max_lon),
+                ]
+            )
+        first_col, last_col = self._col(min_lon), self._col(max_lon)
+        # The cells of a grid row are contiguous in the sorted positions
+        slices = [
+            self.positions[
+                self.offsets[row * self.cols + first_col] : self.offsets[
+                    row * self.cols + last_col + 1
+                ]
+            ]
+            for row in range(self._row(min_lat), self._row(max_lat) + 1)
+        ]
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def bbox_mask(self, min_lat, min_lon, max_lat, max_lon):
+        """Selects the rows inside a bounding box.
+        Parameters
+        ----------
+        min_lat: float
+            Southern edge in degrees
+        min_lon: float
+            Western edge in degrees
+        max_lat: float
+            Northern edge in degrees
+        max_lon: float
+            Eastern edge in degrees. Boxes with min_lon > max_lon cross the antimeridian.
+        Returns
+        -------
+        ndarray
+            1D Boolean array mask, edges included
+        """
+        candidates = self.candidates(min_lat, min_lon, max_lat, max_lon)
+        latitudes = self.latitudes[candidates]
+        longitudes = self.longitudes[candidates]
+        inside = (latitudes >= min_lat) & (latitudes <= max_lat)
+        if min_lon > max_lon:
+            inside &= (longitudes >= min_lon) | (longitudes <= max_lon)
+        else:
+            inside &= (longitudes >= min_lon) & (longitudes <= max_lon)
+        mask = np.full(self.length, False)
+        mask[candidates[inside]] = True
+        return mask
+
+    def polygon_mask(self, vertices):
+        """Selects the rows inside a polygon.
+        Parameters
+        ----------
+        vertices: list of [float, float]
+            [latitude, longitude] vertices of the polygon
+        Returns
+        -------
+        ndarray
+            1D Boolean array mask
+        """
+        vertices = np.asarray(vertices, dtype=np.float64)
+        (min_lat, min_lon), (max_lat, max_lon) = vertices.min(0), vertices.max(0)
+        candidates = self.candidates(min_lat, min_lon, max_lat, max_lon)
+        inside = points_in_polygon(
+            self.latitudes[candidates], self.longitudes[candidates], vertices
+        )
+        mask = np.full(self.length, False)
+        mask[candidates[inside]] = True
+        return mask
+
+
+def get_grid_index(df, lat_col, lon_col):
+    """Returns the spatial index of a DataFrame's coordinates, building it once per DataFrame.
+    Parameters
+    ----------
+    df: pd.DataFrame
+        DataFrame
+    lat_col: str
+        Name of the latitude column
+    lon_col: str
+        Name of the longitude column
+    Returns
+    -------
+    GridIndex
+        Index shared by every spatial filter of this DataFrame
+    """
+    key = ("grid", frame_version(df), lat_col, lon_col)
+    index = index_cache.get(key)
+    if index is None:
+        index = GridIndex(
+            pd.to_numeric(df[lat_col], errors="coerce"),
+            pd.to_numeric(df[lon_col], errors="coerce"),
+        )
+        index_cache.put(key, index)
+    return index
@@ -0,0 +1,108 @@
+import threading
+
+from cache import dataset_key
+from fetching import DownloadCancelled
+from profiling import Profiler, deactivate
+from utils import datetime_to_str, download_data
+
+
+class DownloadJob:
+    """Runs download_data in a background thread.
+
+    The job reports the partitions, rows and response bytes received so far and can be
+    cancelled. Its result is only read once the job finished, so the session keeps
+    working on its previous dataset in the meantime. With a store, jobs of different
+    sessions requesting the same dataset share a single download and its result.
+    Spans of the download are recorded into the job's own profiler, since the
+    session's profiler belongs to the script thread (see Profiler.merge).
+    """
+
+    def __init__(self, download_args, store=None, profiler=None, **options):
+        # Copy the session's arguments, download_data would convert the dates in place
+        self.download_args = {
+            **download_args,
+            "countries": list(download_args["countries"]),
+            "regions": list(download_args["regions"]),
+        }
+        for date in ("start_date", "end_date"):
+            if type(self.download_args[date]) is not str:
+                self.download_args[date] = datetime_to_str(self.download_args[date])
+        self.store = store
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.options = options
+        self.progress = {"completed": 0, "total": 0, "rows": 0, "bytes": 0}
+        self.result = None
+        self.lease = None
+        self.error = None
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _download(self, progress):
+        return download_data(
+            self.download_args,
+            progress=progress,
+            cancel=self.cancelled,
+            **self.options,
+        )
+
+    def _run(self):
+        self.profiler.activate()
+        try:
+            if self.store is None:
+                self.result = self._download(self._report)
+                return
+            self.lease = self.store.lease(
+                dataset_key(**self.download_args),
+                self._download,
+                refresh=self.options.get("refresh", False)
+                or self.options.get("refresh_recent", False),
+                cancel=self.cancelled,
+                progress=self._report,
+            )
+            self.result = self.lease.data
+        except DownloadCancelled:
+            pass
+        except Exception as error:
+            self.error = error
+        finally:
+            deactivate()
+
+    def _report(self, completed, total, rows, nbytes):
+        with self._lock:
+            self.progress["completed"] = completed
+            self.progress["total"] = total
+            self.progress["rows"] += rows
+            self.progress["bytes"] += nbytes
+
+    def cancel(self):
+        """Stops the download, or only this job's wait if another job is downloading the dataset."""
+        self.cancelled.set()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    @property
+    def status(self):
+        if self.running:
+            return "running"
+        if self.error is not None:
+            return "failed"
+        if self.result is None:
+            return "cancelled"
+        return "done"
+
+    @property
+    def fraction(self):
+        """Share of the date partitions downloaded so far."""
+        with self._lock:
+            total = self.progress["total"]
+            return self.progress["completed"] / total if total else 0.0
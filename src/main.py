@@ -1,29 +1,58 @@
 import copy
 import datetime
 import json
+import os
+import time
 from functools import partial
 from io import StringIO
 from random import randint
 
 import leafmap.foliumap as leafmap
-import matplotlib.pyplot as plt
-import numpy as np
 import pandas as pd
 import streamlit as st
+import streamlit.components.v1 as components
 from go_utils import constants, lc, mhm
-from pandas.api.types import is_hashable, is_numeric_dtype
-
-from constants import default_cleanup_dict, protocols
+from pandas.api.types import is_numeric_dtype
+
+from cache import MemoryCache, dataset_cache, dataset_version
+from constants import (
+    cleanup_cache_size,
+    default_cleanup_dict,
+    download_poll_interval,
+    export_cache_size,
+    export_max_serve_bytes,
+    map_cache_size,
+    map_point_budget,
+    mask_cache_size,
+    plot_cache_size,
+    protocols,
+    table_cache_size,
+    table_page_sizes,
+    tile_max_zoom,
+    tile_url,
+)
+from export import export_formats
+from indexing import get_inverted_index
+from jobs import DownloadJob
+from mapping import aggregate_points
+from plotting import get_plots
+from profiling import Profiler, span
+from store import dataset_store
+from table import get_page, get_sort_order, page_count
+from tiles import render_tiles
 from utils import (
-    apply_cleanup_filters,
-    apply_filters,
+    cached_export,
+    cleanup_positions,
     convert_df,
-    download_data,
+    filter_positions,
     generate_json_object,
+    is_list_column,
     numeric_filter,
+    spatial_filter,
     update_data_args,
     value_filter,
 )
+from views import RowView
 
 country_list = [
     country for countries in constants.region_dict.values() for country in countries
@@ -63,11 +92,133 @@ if "display_map" not in st.session_state:
 if "cleanup_filters" not in st.session_state:
     st.session_state["cleanup_filters"] = copy.deepcopy(default_cleanup_dict)
 if "cleaned_data" not in st.session_state:
-    st.session_state["cleaned_data"] = pd.DataFrame()
+    st.session_state["cleaned_data"] = None
 if "selected_filter_defaults" not in st.session_state:
     st.session_state["selected_filter_defaults"] = []
 if "cleanup_defaults" not in st.session_state:
     st.session_state["cleanup_defaults"] = []
+if "mask_cache" not in st.session_state:
+    st.session_state["mask_cache"] = MemoryCache(mask_cache_size)
+if "cleanup_cache" not in st.session_state:
+    st.session_state["cleanup_cache"] = MemoryCache(cleanup_cache_size)
+if "export_cache" not in st.session_state:
+    st.session_state["export_cache"] = MemoryCache(export_cache_size)
+if "map_cache" not in st.session_state:
+    st.session_state["map_cache"] = MemoryCache(map_cache_size)
+if "table_cache" not in st.session_state:
+    st.session_state["table_cache"] = MemoryCache(table_cache_size)
+if "plot_cache" not in st.session_state:
+    st.session_state["plot_cache"] = MemoryCache(plot_cache_size)
+if "map_stats" not in st.session_state:
+    st.session_state["map_stats"] = {}
+if "download_job" not in st.session_state:
+    st.session_state["download_job"] = None
+if "cancelled_jobs" not in st.session_state:
+    st.session_state["cancelled_jobs"] = []
+if "data_lease" not in st.session_state:
+    st.session_state["data_lease"] = None
+if "profiler" not in st.session_state:
+    st.session_state["profiler"] = Profiler()
+if "data_version" not in st.session_state:
+    st.session_state["data_version"] = None
+if "filtered_version" not in st.session_state:
+    st.session_state["filtered_version"] = None
+
+# Spans recorded by this rerun
+st.session_state["profiler"].reset()
+st.session_state["profiler"].activate()
+
+
+def set_data_version(download_args):
+    # Versions are derived from the arguments that produced each dataset, so cache
+    # lookups never hash the data itself. The download time tells refreshes apart.
+    st.session_state["data_version"] = dataset_version(download_args, time.time())
+
+
+def set_dataset(job):
+    # Sessions share the downloaded data, release the old dataset so the store can
+    # drop it once no other session uses it
+    if st.session_state["data_lease"] is not None:
+        st.session_state["data_lease"].release()
+    st.session_state["data_lease"] = job.lease
+    st.session_state["data"] = job.result
+    st.session_state["profiler"].merge(job.profiler.spans)
+    set_data_version(job.download_args)
+
+
+def show_progress(placeholder, job):
+    placeholder.progress(
+        job.fraction,
+        text=f"Downloaded {job.progress['rows']} rows ({job.progress['bytes'] / 1024**2:.1f} MB)",
+    )
+
+
+def add_observation_markers(m, lat_col, lon_col, point_budget):
+    map_points, map_mode = st.session_state["map_cache"].get_or_compute(
+        (st.session_state["filtered_version"], lat_col, lon_col, point_budget),
+        lambda: aggregate_points(
+            st.session_state["filtered_data"], lat_col, lon_col, point_budget
+        ),
+    )
+    if map_mode == "points":
+        m.add_points_from_xy(
+            map_points[["latitude", "longitude"]],
+            x="longitude",
+            y="latitude",
+            popups=[],
+            layer_name="Points",
+        )
+    else:
+        m.add_heatmap(
+            map_points,
+            latitude="latitude",
+            longitude="longitude",
+            value="count",
+            name="Density",
+        )
+    return {
+        "rendered points": len(map_points),
+        "mode": map_mode,
+        "cell size (degrees)": map_points.attrs.get("cell_size"),
+    }
+
+
+def add_observation_tiles(m, lat_col, lon_col):
+    version = st.session_state["filtered_version"]
+    render_tiles(st.session_state["filtered_data"], lat_col, lon_col, version)
+    # The browser only requests the tiles in view, so its cost does not grow with the data
+    m.add_tile_layer(
+        f"{tile_url}/{version}/{{z}}/{{x}}/{{y}}.png",
+        name="Observations",
+        attribution="GLOBE",
+        max_native_zoom=tile_max_zoom,
+    )
+    return {"mode": "tiles"}
+
+
+def spatial_filter_widgets(lat_col, lon_col):
+    shape = st.radio("Shape", ["Bounding box", "Polygon"], horizontal=True)
+    if shape == "Bounding box":
+        south, north = st.slider("Latitude", -90.0, 90.0, (-90.0, 90.0))
+        west, east = st.slider("Longitude", -180.0, 180.0, (-180.0, 180.0))
+        coords = [south, west, north, east]
+        shape = "bbox"
+    else:
+        vertices = st.text_input(
+            "Vertices", placeholder="[[lat, lon], [lat, lon], [lat, lon], ...]"
+        )
+        try:
+            coords = [[float(lat), float(lon)] for lat, lon in json.loads(vertices)]
+        except (ValueError, TypeError):
+            if vertices:
+                st.error("Vertices must be a list of at least 3 [lat, lon] pairs")
+            return None, None
+        if len(coords) < 3:
+            st.error("Vertices must be a list of at least 3 [lat, lon] pairs")
+            return None, None
+        shape = "polygon"
+    name = f"{lat_col}, {lon_col} within {shape} {coords}"
+    return name, partial(spatial_filter, shape, coords, lat_col, lon_col)
 
 
 def clear_filters():
@@ -137,12 +288,57 @@ with filtering:
     )
 
     # Retrieves cleaned GLOBE Data matching your given parameters
+    refresh_mode = st.selectbox(
+        "Cached data",
+        ["Use cached data", "Refresh recent months", "Refresh everything"],
+        help="Recent months may still receive new observations, older months are kept",
+    )
     if st.button("Get raw data"):
-        st.session_state["data"] = download_data(st.session_state["download_args"])
-        clear_filters()
+        if st.session_state["download_job"] is not None:
+            st.session_state["download_job"].cancel()
+            st.session_state["cancelled_jobs"].append(st.session_state["download_job"])
+        st.session_state["download_job"] = DownloadJob(
+            st.session_state["download_args"],
+            store=dataset_store,
+            refresh=refresh_mode == "Refresh everything",
+            refresh_recent=refresh_mode == "Refresh recent months",
+        ).start()
+
+    # The previous dataset stays usable until the download finished
+    progress_placeholder = None
+    job = st.session_state["download_job"]
+    if job is not None and job.running:
+        progress_placeholder = st.empty()
+        show_progress(progress_placeholder, job)
+        if st.button("Cancel download"):
+            job.cancel()
+    elif job is not None:
+        st.session_state["download_job"] = None
+        if job.status == "done":
+            # Swap in the new dataset and reset everything derived from the old one
+            set_dataset(job)
+            clear_filters()
+        elif job.status == "failed":
+            st.error(f"Download failed: {job.error}")
+        else:
+            st.info("Download cancelled")
+    # Cancelled downloads stop after their current request, keep track of them until then
+    st.session_state["cancelled_jobs"] = [
+        cancelled
+        for cancelled in st.session_state["cancelled_jobs"]
+        if cancelled.running
+    ]
+    if st.session_state["cancelled_jobs"]:
+        st.caption(
+            f"Stopping {len(st.session_state['cancelled_jobs'])} cancelled download(s)"
+        )
 
     if st.session_state["file_loaded"]:
-        st.session_state["data"] = download_data(st.session_state["download_args"])
+        job = DownloadJob(st.session_state["download_args"], store=dataset_store)
+        job.start().join()
+        if job.error is not None:
+            raise job.error
+        set_dataset(job)
         st.session_state["cleanup_defaults"] = st.session_state["cleanup_filters"][
             "duplicate_filter_cols"
         ]
@@ -196,8 +392,16 @@ with filtering:
                 ] = group_criteria
                 st.session_state["cleanup_filters"]["duplicate_filter_size"] = min_size
             st.session_state["cleanup_filters"]["duplicate_filter"] = duplicate_filter
-        st.session_state["cleaned_data"] = apply_cleanup_filters(
-            st.session_state["data"], **st.session_state["cleanup_filters"]
+        # Cleaned and filtered data are views over the downloaded rows, rows are
+        # only copied for the table page, plots and exports
+        st.session_state["cleaned_data"] = RowView(
+            st.session_state["data"],
+            cleanup_positions(
+                st.session_state["data"],
+                **st.session_state["cleanup_filters"],
+                version=st.session_state["data_version"],
+                cache=st.session_state["cleanup_cache"],
+            ),
         )
 
         st.header("Filter Selector")
@@ -213,35 +417,27 @@ with filtering:
         selected_col = st.selectbox(
             "Select the column", st.session_state["cleaned_data"].columns
         )
+        # Only the selected column of the cleaned rows is copied
+        selected_series = st.session_state["cleaned_data"][selected_col]
 
-        if (
-            is_numeric_dtype(st.session_state["cleaned_data"][selected_col])
-            and len(pd.unique(st.session_state["cleaned_data"][selected_col])) > 2
-        ):
+        if is_numeric_dtype(selected_series) and len(pd.unique(selected_series)) > 2:
             selected_op = st.selectbox("Operation", [">", "<", "==", ">=", "<=", "!="])
             value = st.number_input("Enter value")
             filter_function = partial(numeric_filter, selected_op, value, selected_col)
             filter_type = "numeric"
             name = f"{selected_col} {selected_op} {value}"
         else:
-            if np.all(
-                [
-                    np.vectorize(is_hashable)(
-                        st.session_state["cleaned_data"][selected_col].to_numpy()
-                    )
-                ]
-            ):
-                selection_values = pd.unique(
-                    st.session_state["cleaned_data"][selected_col]
-                )
+            if not is_list_column(selected_series):
+                selection_values = pd.unique(selected_series)
             else:
-                teams = []
-                for _, row in st.session_state["cleaned_data"].iterrows():
-                    if not is_hashable(row[selected_col]):
-                        for team in row[selected_col]:
-                            teams.append(team)
-                teams = set(teams)
-                selection_values = list(teams)
+                # The index of the downloaded data is built once for every cleanup,
+                # only values of the cleaned rows are offered like for other columns
+                selection_values = sorted(
+                    get_inverted_index(
+                        st.session_state["data"], selected_col
+                    ).values_in(st.session_state["cleaned_data"].positions),
+                    key=str,
+                )
 
             selected_values = st.multiselect("Select values", selection_values)
 
@@ -257,10 +453,35 @@ with filtering:
             st.session_state["selected_filters"].append(name)
             st.experimental_rerun()
 
-        st.session_state["filtered_data"] = apply_filters(
-            st.session_state["cleaned_data"],
-            st.session_state["filters"],
-            st.session_state["selected_filters"],
+        st.subheader("Spatial Filter")
+        prefix = constants.abbreviation_dict[
+            st.session_state["download_args"]["protocol"]
+        ]
+        spatial_name, spatial_function = spatial_filter_widgets(
+            f"{prefix}_Latitude", f"{prefix}_Longitude"
+        )
+        if spatial_name and st.button("Add spatial filter"):
+            st.session_state["filters"][spatial_name] = spatial_function
+            st.session_state["selected_filters"].append(spatial_name)
+            st.experimental_rerun()
+
+        cleaned_version = dataset_version(
+            st.session_state["data_version"], st.session_state["cleanup_filters"]
+        )
+        st.session_state["filtered_version"] = dataset_version(
+            cleaned_version, sorted(st.session_state["selected_filters"])
+        )
+        # Filter masks cover every downloaded row, so they survive cleanup changes
+        st.session_state["filtered_data"] = RowView(
+            st.session_state["data"],
+            filter_positions(
+                st.session_state["data"],
+                st.session_state["filters"],
+                st.session_state["selected_filters"],
+                st.session_state["cleaned_data"].positions,
+                version=st.session_state["data_version"],
+                cache=st.session_state["mask_cache"],
+            ),
         )
 
 has_data = (
@@ -280,31 +501,101 @@ with data_view:
             ]
             lon_col = f"{prefix}_Longitude"
             lat_col = f"{prefix}_Latitude"
-            m = leafmap.Map()
-            m.add_points_from_xy(
-                st.session_state["filtered_data"][[lat_col, lon_col]],
-                x=lon_col,
-                y=lat_col,
-                popups=[],
-                layer_name="Points",
+            map_layer = st.radio(
+                "Map layer", ["Markers", "Raster tiles"], horizontal=True
             )
-            m.to_streamlit()
-
-        # Display data table (first 10000 entries)
-        st.write(
-            st.session_state["filtered_data"][
-                : min(10000, len(st.session_state["filtered_data"]))
-            ]
-        )
+            with span("map", layer=map_layer):
+                start = time.perf_counter()
+                m = leafmap.Map()
+                if map_layer == "Raster tiles":
+                    map_stats = add_observation_tiles(m, lat_col, lon_col)
+                else:
+                    point_budget = st.number_input(
+                        "Map point budget",
+                        min_value=1,
+                        value=map_point_budget,
+                        step=1000,
+                    )
+                    map_stats = add_observation_markers(
+                        m, lat_col, lon_col, point_budget
+                    )
+                # Same as m.to_streamlit(), but keeps the HTML to report its size
+                map_html = m.to_html()
+                components.html(map_html, height=600)
+                st.session_state["map_stats"] = {
+                    "observations": len(st.session_state["filtered_data"]),
+                    **map_stats,
+                    "render time (s)": round(time.perf_counter() - start, 3),
+                    "payload (KB)": round(len(map_html.encode("utf-8")) / 1024, 1),
+                }
+
+        # Display one page of the data table
+        with span("table"):
+            filtered_data = st.session_state["filtered_data"]
+            sort_by = st.selectbox("Sort by", [None, *filtered_data.columns])
+            ascending = st.checkbox("Ascending", value=True)
+            page_size = st.selectbox("Rows per page", table_page_sizes)
+            pages = page_count(len(filtered_data), page_size)
+            page = st.number_input("Page", min_value=1, max_value=pages, value=1)
+            order = (
+                None
+                if sort_by is None
+                else get_sort_order(
+                    filtered_data,
+                    sort_by,
+                    ascending,
+                    st.session_state["filtered_version"],
+                    st.session_state["table_cache"],
+                )
+            )
+            st.write(get_page(filtered_data, page - 1, page_size, order))
+            st.caption(f"Page {page} of {pages} ({len(filtered_data)} rows)")
 
 with plots:
     if has_data:
-        plotting[st.session_state["protocol"]](st.session_state["filtered_data"])
-        for num in plt.get_fignums():
-            fig = plt.figure(num)
-            st.pyplot(fig)
+        with span("plots"):
+            for image in get_plots(
+                plotting[st.session_state["protocol"]],
+                st.session_state["filtered_data"],
+                st.session_state["filtered_version"],
+                st.session_state["plot_cache"],
+            ):
+                st.image(image)
 
 with st.sidebar:
+    with st.expander("Download Cache"):
+        st.write(
+            {
+                **dataset_cache.stats,
+                "size (MB)": round(dataset_cache.size() / 1024**2, 2),
+            }
+        )
+        if st.button("Clear cache"):
+            dataset_cache.clear()
+    with st.expander("Map"):
+        st.write(st.session_state["map_stats"])
+    with st.expander("Shared Datasets"):
+        st.write({"datasets": len(dataset_store), **dataset_store.stats})
+    with st.expander("Filter Caches"):
+        st.write({"cleanup": st.session_state["cleanup_cache"].stats})
+        st.write({"filters": st.session_state["mask_cache"].stats})
+
+    if st.session_state["data"] is not None:
+        memory_report = st.session_state["data"].attrs.get("memory_report")
+        if memory_report:
+            with st.expander("Memory"):
+                st.write(
+                    {
+                        "before (MB)": round(
+                            memory_report["before_bytes"] / 1024**2, 2
+                        ),
+                        "after (MB)": round(
+                            memory_report["after_bytes"] / 1024**2, 2
+                        ),
+                    }
+                )
+                st.write(memory_report["converted_columns"])
+
     st.header("Upload JSON")
     if "uploader_key" not in st.session_state:
         st.session_state["uploader_key"] = str(randint(1000, 100000000))
@@ -326,19 +617,71 @@ with st.sidebar:
             st.session_state.pop("uploader_key")
         st.experimental_rerun()
 
-    if type(st.session_state["filtered_data"]) is pd.DataFrame:
+    if st.session_state["filtered_data"] is not None:
         st.header("Get the Data")
-        st.download_button(
-            "Download CSV",
-            convert_df(st.session_state["filtered_data"]),
-            file_name=f"{st.session_state['protocol']}-{len(st.session_state['filtered_data'])}.csv",
+        export_format = st.selectbox("Format", export_formats.keys())
+        extension, mime = export_formats[export_format]
+        # Exports are only written on request, not after every filter change
+        export_path = cached_export(
+            extension,
+            st.session_state["filtered_version"],
+            st.session_state["export_cache"],
         )
+        if export_path is None and st.button("Prepare export"):
+            export_path = convert_df(
+                st.session_state["filtered_data"],
+                extension,
+                st.session_state["filtered_version"],
+                st.session_state["export_cache"],
+            )
+        if export_path is not None:
+            export_size = os.path.getsize(export_path)
+            if export_size > export_max_serve_bytes:
+                st.warning(
+                    f"The export is {export_size / 1024**2:.0f} MB, exports over "
+                    f"{export_max_serve_bytes / 1024**2:.0f} MB are not served by the "
+                    "dashboard. Narrow down the filters or use the batch CLI "
+                    "(python src/cli.py) with the metadata JSON below."
+                )
+            else:
+                with open(export_path, "rb") as export_file:
+                    st.download_button(
+                        f"Download {export_format}",
+                        export_file,
+                        file_name=f"{st.session_state['protocol']}-{len(st.session_state['filtered_data'])}.{extension}",
+                        mime=mime,
+                    )
 
         st.header("Download Metadata JSON")
         download_data = {**st.session_state["download_args"], **st.session_state}
-        json_obj = str(generate_json_object(download_data)).encode("utf-8")
+        # The metadata also depends on the current widget values of the download args
+        with span("metadata JSON"):
+            json_obj = st.session_state["export_cache"].get_or_compute(
+                (
+                    dataset_version(
+                        st.session_state["filtered_version"],
+                        st.session_state["download_args"],
+                    ),
+                    "json",
+                ),
+                lambda: str(generate_json_object(download_data)).encode("utf-8"),
+            )
         st.download_button(
             "Download Metadata JSON",
             json_obj,
             file_name=f"{st.session_state['protocol']}-{len(st.session_state['filtered_data'])}.json",
         )
+
+    if st.session_state["profiler"].enabled:
+        with st.expander("Performance"):
+            st.dataframe(pd.DataFrame(st.session_state["profiler"].spans))
+
+# While a download is in progress only its progress bar is updated, the page reruns
+# once to swap in its result. Widget interactions interrupt the wait.
+if st.session_state["download_job"] is not None:
+    job = st.session_state["download_job"]
+    while job.running:
+        time.sleep(download_poll_interval)
+        if progress_placeholder is not None:
+            show_progress(progress_placeholder, job)
+    st.experimental_rerun()
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+from constants import map_cell_size, map_point_budget
+
+
+def grid_cells(latitudes, longitudes, cell_size=map_cell_size):
+    """Assigns coordinates to the cells of a regular latitude/longitude grid.
+    Parameters
+    ----------
+    latitudes: np.ndarray
+        Latitudes in degrees
+    longitudes: np.ndarray
+        Longitudes in degrees
+    cell_size: float, default=map_cell_size
+        Width and height of a cell in degrees
+    Returns
+    -------
+    tuple of np.ndarray
+        Row and column of the cell containing every coordinate
+    """
+    rows = np.floor((latitudes + 90) / cell_size).astype(np.int64)
+    cols = np.floor((longitudes + 180) / cell_size).astype(np.int64)
+    return rows, cols
+
+
+def fit_grid(rows, cols, budget):
+    """Coarsens a grid until the points occupy at most budget cells.
+    Parameters
+    ----------
+    rows: np.ndarray
+        Cell rows of the points at the finest resolution (see grid_cells)
+    cols: np.ndarray
+        Cell columns of the points at the finest resolution
+    budget: int
+        Maximum number of occupied cells
+    Returns
+    -------
+    tuple of (np.ndarray, int)
+        Cell id of every point and the number of times the cell size was doubled
+    """
+    if budget < 1:
+        raise ValueError(f"The point budget must be positive, got {budget}")
+    level = 0
+    while True:
+        # Doubling the cell size halves the row and column indices
+        cells = ((rows >> level) << 32) | (cols >> level)
+        if len(pd.unique(cells)) <= budget:
+            return cells, level
+        level += 1
+
+
+def grid_aggregate(latitudes, longitudes, budget, cell_size=map_cell_size):
+    """Bins points into at most budget grid cells.
+    Parameters
+    ----------
+    latitudes: np.ndarray
+        Latitudes in degrees
+    longitudes: np.ndarray
+        Longitudes in degrees
+    budget: int
+        Maximum number of cells
+    cell_size: float, default=map_cell_size
+        Finest cell size in degrees, it is doubled until the points fit in the budget
+    Returns
+    -------
+    pd.DataFrame
+        One row per occupied cell with the mean latitude and longitude of its points and their count. attrs["cell_size"] holds the cell size that was used.
+    """
+    cells, level = fit_grid(*grid_cells(latitudes, longitudes, cell_size), budget)
+    points = pd.DataFrame({"latitude": latitudes, "longitude": longitudes})
+    aggregated = (
+        points.groupby(cells, sort=True)
+        .agg(
+            latitude=("latitude", "mean"),
+            longitude=("longitude", "mean"),
+            count=("latitude", "size"),
+        )
+        .reset_index(drop=True)
+    )
+    aggregated.attrs["cell_size"] = cell_size * 2**level
+    return aggregated
+
+
+def aggregate_points(df, lat_col, lon_col, point_budget=map_point_budget):
+    """Reduces a dataset to what the map has to render.
+    Parameters
+    ----------
+    df: pd.DataFrame
+        Data to display
+    lat_col: str
+        Name of the latitude column
+    lon_col: str
+        Name of the longitude column
+    point_budget: int, default=map_point_budget
+        Maximum number of points sent to the browser
+    Returns
+    -------
+    tuple of (pd.DataFrame, str)
+        Points with latitude, longitude and count columns, and the rendering mode. The mode is "points" if every observation fits in the budget and "heatmap" if the observations were binned into grid cells.
+    """
+    latitudes = pd.to_numeric(df[lat_col], errors="coerce").to_numpy(dtype=np.float64)
+    longitudes = pd.to_numeric(df[lon_col], errors="coerce").to_numpy(dtype=np.float64)
+    # Comparisons with NaN are False, so this also drops missing coordinates
+    located = (np.abs(latitudes) <= 90) & (np.abs(longitudes) <= 180)
+    latitudes, longitudes = latitudes[located], longitudes[located]
+    if len(latitudes) <= point_budget:
+        points = pd.DataFrame(
+            {
+                "latitude": latitudes,
+                "longitude": longitudes,
+                "count": np.ones(len(latitudes), dtype=np.int64),
+            }
+        )
+        return points, "points"
+    return grid_aggregate(latitudes, longitudes, point_budget), "heatmap"
@@ -0,0 +1,62 @@
+import io
+import threading
+
+import matplotlib.pyplot as plt
+
+from views import materialize, restore_dtypes
+
+# pyplot's figure registry is shared by every session of the process
+_pyplot_lock = threading.Lock()
+
+
+def render_figures(plot_function, df):
+    """Runs a plotting function and renders the figures it creates.
+    Parameters
+    ----------
+    plot_function: callable
+        Function drawing matplotlib figures of df (e.g. go_utils.mhm.diagnostic_plots)
+    df: pd.DataFrame
+        Data to plot
+    Returns
+    -------
+    list of bytes
+        PNG image of every new figure. The figures are closed, so they do not accumulate across reruns. Plots are rendered one at a time, so concurrent sessions never see each other's figures.
+    """
+    with _pyplot_lock:
+        existing = set(plt.get_fignums())
+        try:
+            plot_function(df)
+            images = []
+            for num in plt.get_fignums():
+                if num in existing:
+                    continue
+                buffer = io.BytesIO()
+                plt.figure(num).savefig(buffer, format="png", bbox_inches="tight")
+                images.append(buffer.getvalue())
+        finally:
+            for num in set(plt.get_fignums()) - existing:
+                plt.close(num)
+    return images
+
+
+def get_plots(plot_function, df, version, cache):
+    """Returns the rendered plots of a dataset, only plotting it once per version.
+    Parameters
+    ----------
+    plot_function: callable
+        Function drawing matplotlib figures of df
+    df: pd.DataFrame or views.RowView
+        Data to plot, the rows of a view are only copied if the plots are not cached. Columns are plotted with their original dtypes (see views.restore_dtypes).
+    version: str
+        Version token of df (see cache.dataset_version)
+    cache: MemoryCache
+        Cache of rendered plots
+    Returns
+    -------
+    list of bytes
+        PNG image of every figure
+    """
+    key = (version, plot_function.__module__, plot_function.__name__)
+    return cache.get_or_compute(
+        key, lambda: render_figures(plot_function, restore_dtypes(materialize(df)))
+    )
@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+import resource
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+from constants import profiling_enabled, profiling_log
+
+logger = logging.getLogger("globe.profiling")
+
+# Streamlit runs every session's script in its own thread, so each thread records
+# into the profiler of the session it is running
+_local = threading.local()
+_disabled = nullcontext()
+
+
+def current_rss():
+    """Returns the resident memory of the process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Not on Linux, fall back to the peak resident memory
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Profiler:
+    """Records the time and memory of the stages of a rerun."""
+
+    def __init__(self, enabled=profiling_enabled, log=profiling_log):
+        self.enabled = enabled
+        self.log = log
+        self.spans = []
+        self._depth = 0
+
+    def reset(self):
+        self.spans = []
+        self._depth = 0
+
+    def activate(self):
+        """Makes span() record into this profiler in the current thread."""
+        _local.profiler = self if self.enabled else None
+
+    def merge(self, spans):
+        """Adds spans recorded by another profiler (e.g. of a background download job) at the current depth."""
+        self.spans.extend(
+            {**entry, "depth": entry["depth"] + self._depth} for entry in spans
+        )
+
+    def start(self, stage, fields):
+        # Spans are stored in start order, so nested stages follow their parent
+        entry = {"stage": stage, "depth": self._depth, **fields}
+        self.spans.append(entry)
+        self._depth += 1
+        return entry
+
+    def finish(self, entry, seconds, rss_delta):
+        self._depth -= 1
+        entry["seconds"] = round(seconds, 4)
+        entry["rss_delta_mb"] = round(rss_delta / 1024**2, 1)
+        if self.log:
+            logger.info(json.dumps(entry, default=str))
+
+
+class Span:
+    def __init__(self, profiler, stage, fields):
+        self.profiler = profiler
+        self.stage = stage
+        self.fields = fields
+
+    def __enter__(self):
+        self.entry = self.profiler.start(self.stage, self.fields)
+        self.rss = current_rss()
+        self.start = time.perf_counter()
+        return self.entry
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        self.profiler.finish(self.entry, seconds, current_rss() - self.rss)
+        return False
+
+
+def span(stage, **fields):
+    """Measures a stage of the current rerun.
+    Parameters
+    ----------
+    stage: str
+        Name of the stage (e.g. "download")
+    **fields:
+        Extra values recorded with the span (e.g. number of rows)
+    Returns
+    -------
+    context manager
+        Records the wall time and resident memory change of its block into the active profiler. Does nothing if no profiler is active in this thread.
+    """
+    profiler = getattr(_local, "profiler", None)
+    if profiler is None:
+        return _disabled
+    return Span(profiler, stage, fields)
+
+
+def profiled(stage):
+    """Decorator measuring every call of a function as a span."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def deactivate():
+    _local.profiler = None
@@ -0,0 +1,217 @@
+"""Local stand-in for the GLOBE API that records and replays its responses.
+
+Record responses of the GLOBE API (requests that were recorded before are replayed):
+    python src/standin.py record
+Replay them offline with injected latency, throttling and failures:
+    python src/standin.py replay --latency 0.5 --bandwidth 1000000 --failure-rate 0.1
+and point the dashboard at the stand-in:
+    GLOBE_API_URL=http://127.0.0.1:8765/ streamlit run src/main.py
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import requests
+
+from constants import globe_api_upstream, request_timeout, standin_dir, standin_port
+
+
+def recording_key(params):
+    """Generates the recording key of an API request from its query parameters, ignoring their order."""
+    request = json.dumps(sorted(params.items()))
+    return hashlib.sha1(request.encode("utf-8")).hexdigest()
+
+
+class Recordings:
+    """Directory of recorded API response bodies, one file per request."""
+
+    def __init__(self, directory=standin_dir):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key, body):
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = self._path(key) + f".{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(body)
+        os.replace(temp_path, self._path(key))
+
+
+class StandInServer(ThreadingHTTPServer):
+    """HTTP server replaying recorded GLOBE API responses.
+
+    Requests missing from the recordings are forwarded to `upstream` and recorded if
+    it is set, and answered with 404 otherwise. Every response is delayed by `latency`
+    seconds and sent at `bandwidth` bytes per second. The first `fail_first` attempts
+    of every request and a `failure_rate` share of the others (drawn from a generator
+    seeded with `seed`) are answered with 503, so runs are reproducible.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        recordings,
+        upstream=None,
+        latency=0.0,
+        bandwidth=None,
+        failure_rate=0.0,
+        fail_first=0,
+        seed=0,
+    ):
+        super().__init__(address, StandInHandler)
+        self.recordings = recordings
+        self.upstream = upstream
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.fail_first = fail_first
+        self.random = random.Random(seed)
+        self.attempts = {}
+        self.stats = {"requests": 0, "failures": 0, "recorded": 0, "missing": 0}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/"
+
+    def should_fail(self, key):
+        with self.lock:
+            self.stats["requests"] += 1
+            attempt = self.attempts[key] = self.attempts.get(key, 0) + 1
+            fail = (
+                attempt <= self.fail_first or self.random.random() < self.failure_rate
+            )
+            if fail:
+                self.stats["failures"] += 1
+            return fail
+
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def response_body(self, key, params):
+        body = self.recordings.get(key)
+        if body is None and self.upstream:
+            response = requests.get(
+                self.upstream, params=params, timeout=request_timeout
+            )
+            if response:
+                body = response.content
+                self.recordings.put(key, body)
+                self.count("recorded")
+        if body is None:
+            self.count("missing")
+        return body
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    chunk_size = 64 * 1024
+
+    def do_GET(self):
+        params = dict(parse_qsl(urlparse(self.path).query))
+        key = recording_key(params)
+        if self.server.should_fail(key):
+            self.send_error(503, "Injected failure")
+            return
+        body = self.server.response_body(key, params)
+        time.sleep(self.server.latency)
+        if body is None:
+            self.send_error(404, "No recording for this request")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        for start in range(0, len(body), self.chunk_size):
+            chunk = body[start : start + self.chunk_size]
+            self.wfile.write(chunk)
+            if self.server.bandwidth:
+                time.sleep(len(chunk) / self.server.bandwidth)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def run_stand_in(directory=standin_dir, port=0, **options):
+    """Runs a stand-in server in a background thread.
+    Parameters
+    ----------
+    directory: str, default=standin_dir
+        Directory of the recordings
+    port: int, default=0
+        Port to listen on, any free port if 0
+    **options:
+        upstream, latency, bandwidth, failure_rate, fail_first and seed of the StandInServer
+    Returns
+    -------
+    context manager of StandInServer
+        The running server, its url is passed to the download functions as api_url
+    """
+    server = StandInServer(("127.0.0.1", port), Recordings(directory), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--directory", default=standin_dir)
+    parser.add_argument("--port", type=int, default=standin_port)
+    parser.add_argument("--upstream", default=globe_api_upstream)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--bandwidth", type=float, help="bytes per second")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--fail-first", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = StandInServer(
+        ("127.0.0.1", args.port),
+        Recordings(args.directory),
+        upstream=args.upstream if args.mode == "record" else None,
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        failure_rate=args.failure_rate,
+        fail_first=args.fail_first,
+        seed=args.seed,
+    )
+    print(f"Serving {args.mode}ed GLOBE API responses at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
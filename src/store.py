@@ -0,0 +1,141 @@
+import threading
+import weakref
+
+from fetching import DownloadCancelled
+
+
+class _Entry:
+    def __init__(self):
+        self.ready = threading.Event()
+        self.data = None
+        self.error = None
+        self.refs = 0
+        self.progress = (0, 0, 0, 0)
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def listen(self, listener):
+        # Sessions joining a running load first receive the progress made so far
+        with self.lock:
+            self.listeners.append(listener)
+            if self.progress[1]:
+                listener(*self.progress)
+
+    def report(self, completed, total, rows, nbytes):
+        with self.lock:
+            self.progress = (
+                completed,
+                total,
+                self.progress[2] + rows,
+                self.progress[3] + nbytes,
+            )
+            for listener in self.listeners:
+                listener(completed, total, rows, nbytes)
+
+
+class Lease:
+    """Reference of a session to a dataset of a DatasetStore.
+
+    The reference is released by release() or once the lease is garbage collected,
+    e.g. when Streamlit discards the state of a closed session.
+    """
+
+    def __init__(self, store, key, entry):
+        self.key = key
+        self.data = entry.data
+        self._release = weakref.finalize(self, store._release, key, entry)
+
+    def release(self):
+        self._release()
+
+
+class DatasetStore:
+    """Process-wide store of datasets shared by every session.
+
+    Concurrent requests of the same dataset are coalesced into a single load and every
+    session receives a reference to the same DataFrame, which must therefore be
+    treated as read-only. Datasets are dropped once no session references them.
+    """
+
+    def __init__(self):
+        self.stats = {"loads": 0, "shared": 0, "evictions": 0}
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _join(self, key, refresh):
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None or (refresh and entry.ready.is_set())
+            if owner:
+                # Sessions still using a refreshed dataset keep their reference to it
+                entry = self._entries[key] = _Entry()
+                self.stats["loads"] += 1
+            else:
+                self.stats["shared"] += 1
+            entry.refs += 1
+            return entry, owner
+
+    def _load(self, key, entry, load):
+        try:
+            entry.data = load(entry.report)
+        except BaseException as error:
+            entry.error = error
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+        finally:
+            entry.ready.set()
+
+    def _wait(self, key, entry, cancel):
+        while not entry.ready.wait(0.1):
+            if cancel is not None and cancel.is_set():
+                self._release(key, entry)
+                raise DownloadCancelled()
+
+    def lease(self, key, load, refresh=False, cancel=None, progress=None):
+        """Returns a reference to a dataset, loading it if no session holds it yet.
+        Parameters
+        ----------
+        key: str
+            Dataset key (see cache.dataset_key)
+        load: callable
+            Loads the dataset, only called if the dataset is neither stored nor being loaded. It is called as load(progress) and reports its progress to every session waiting for it through progress(completed, total, rows, nbytes) (see fetching.fetch_partitioned_data).
+        refresh: bool, default=False
+            Whether to load the dataset again even if it is stored
+        cancel: threading.Event, default=None
+            Stops waiting for the load of another session with fetching.DownloadCancelled once set
+        progress: callable, default=None
+            Receives the progress of the load, also if another session started it
+        Returns
+        -------
+        Lease
+            Reference whose data attribute holds the shared dataset. Errors of the load are raised in every waiting session.
+        """
+        while True:
+            entry, owner = self._join(key, refresh)
+            if progress is not None:
+                entry.listen(progress)
+            if owner:
+                self._load(key, entry, load)
+            else:
+                self._wait(key, entry, cancel)
+            if entry.error is None:
+                return Lease(self, key, entry)
+            self._release(key, entry)
+            # A load cancelled by another session is retried by this one
+            if owner or not isinstance(entry.error, DownloadCancelled):
+                raise entry.error
+
+    def _release(self, key, entry):
+        with self._lock:
+            entry.refs -= 1
+            if entry.refs <= 0 and self._entries.get(key) is entry:
+                del self._entries[key]
+                if entry.error is None:
+                    self.stats["evictions"] += 1
+
+
+dataset_store = DatasetStore()
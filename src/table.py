@@ -0,0 +1,87 @@
+import numpy as np
+
+from utils import is_list_column
+
+
+def sort_order(df, column, ascending=True):
+    """Computes the row positions of a DataFrame sorted by a column.
+    Parameters
+    ----------
+    df: pd.DataFrame or views.RowView
+        DataFrame or rows of a DataFrame
+    column: str
+        Column to sort by
+    ascending: bool, default=True
+        Sort direction
+    Returns
+    -------
+    np.ndarray
+        Positions of the rows in sorted order. The sort is stable and missing values come last in both directions.
+    """
+    series = df[column].reset_index(drop=True)
+    # Lists (e.g. GLOBE teams) and columns mixing types sort by their text
+    key = _as_text if is_list_column(series) else None
+    try:
+        ordered = series.sort_values(
+            ascending=ascending, kind="stable", na_position="last", key=key
+        )
+    except TypeError:
+        ordered = series.sort_values(
+            ascending=ascending, kind="stable", na_position="last", key=_as_text
+        )
+    return ordered.index.to_numpy()
+
+
+def _as_text(series):
+    return series.astype(str).where(series.notna())
+
+
+def get_sort_order(df, column, ascending, version, cache):
+    """Returns the sort order of a dataset, computing it once per version and direction.
+    Parameters
+    ----------
+    df: pd.DataFrame
+        DataFrame
+    column: str
+        Column to sort by
+    ascending: bool
+        Sort direction
+    version: str
+        Version token of df (see cache.dataset_version)
+    cache: MemoryCache
+        Cache of sort orders
+    Returns
+    -------
+    np.ndarray
+        Positions of the rows in sorted order, shared by every page
+    """
+    return cache.get_or_compute(
+        (version, column, ascending), lambda: sort_order(df, column, ascending)
+    )
+
+
+def get_page(df, page, page_size, order=None):
+    """Slices one page of a DataFrame.
+    Parameters
+    ----------
+    df: pd.DataFrame or views.RowView
+        DataFrame or rows of a DataFrame
+    page: int
+        Page number, starting at 0
+    page_size: int
+        Number of rows per page
+    order: np.ndarray, default=None
+        Row positions in display order (see sort_order). Rows keep their order if None.
+    Returns
+    -------
+    pd.DataFrame
+        Rows of the page, only these rows are sent to the browser
+    """
+    start = page * page_size
+    if order is None:
+        return df.take(np.arange(start, min(start + page_size, len(df))))
+    return df.take(order[start : start + page_size])
+
+
+def page_count(rows, page_size):
+    return max(1, int(np.ceil(rows / page_size)))
@@ -0,0 +1,178 @@
+import gc
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils  # noqa: E402
+from cache import (  # noqa: E402
+    DatasetCache,
+    MemoryCache,
+    dataset_key,
+    dataset_version,
+    frame_version,
+)
+
+test_df = pd.DataFrame.from_dict(
+    {
+        "mhm_Latitude": [38.5, 14.5, 87.5, 31.41],
+        "mhm_WaterSource": ["pond", "lake", "pond", "container"],
+        "mhm_GLOBETeams": [["SEES2021"], ["SEES2020", "ABC"], ["X"], ["Y"]],
+    }
+)
+
+key_test_values = [
+    (
+        ("mosquito_habitat_mapper", "2017-05-31", "2021-12-25", ["Brazil", "Peru"], []),
+        ("mosquito_habitat_mapper", "2017-05-31", "2021-12-25", ["Peru", "Brazil"], []),
+        True,
+    ),
+    (
+        ("mosquito_habitat_mapper", "2017-05-31", "2021-12-25", [], []),
+        ("land_covers", "2017-05-31", "2021-12-25", [], []),
+        False,
+    ),
+    (
+        ("land_covers", "2017-05-31", "2021-12-25", [], []),
+        ("land_covers", "2017-05-31", "2021-12-26", [], []),
+        False,
+    ),
+]
+
+
+@pytest.mark.parametrize("first, second, same", key_test_values)
+def test_dataset_key(first, second, same):
+    assert (dataset_key(*first) == dataset_key(*second)) == same
+
+
+def test_cache_roundtrip(tmp_path):
+    cache = DatasetCache(str(tmp_path))
+    assert cache.get("a") is None
+    cache.put("a", test_df)
+    assert test_df.equals(cache.get("a"))
+    assert cache.stats == {"hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_cache_ttl(tmp_path):
+    cache = DatasetCache(str(tmp_path), ttl=60)
+    cache.put("a", test_df)
+    path = os.path.join(str(tmp_path), "a.parquet")
+    os.utime(path, (time.time() - 120, time.time() - 120))
+    assert cache.get("a") is None
+    assert cache.get("a", ttl=300) is not None
+
+
+def test_cache_lru_eviction(tmp_path):
+    cache = DatasetCache(str(tmp_path))
+    cache.put("a", test_df)
+    cache.max_bytes = cache.size() * 2
+    cache.put("b", test_df)
+    # Reading "a" makes "b" the least recently used entry
+    os.utime(os.path.join(str(tmp_path), "b.parquet"), (0, time.time()))
+    cache.get("a")
+    cache.put("c", test_df)
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.stats["evictions"] == 1
+
+
+def test_download_data_cache(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_fetch_data(download_args, *args):
+        calls.append(download_args)
+        return test_df
+
+    monkeypatch.setattr(utils, "fetch_data", fake_fetch_data)
+    cache = DatasetCache(str(tmp_path))
+    download_args = {
+        "protocol": "mosquito_habitat_mapper",
+        "start_date": "2017-05-31",
+        "end_date": "2021-12-25",
+        "countries": [],
+        "regions": [],
+    }
+    for _ in range(3):
+        assert test_df.equals(utils.download_data(download_args, cache))
+    assert len(calls) == 1
+
+    utils.download_data(download_args, cache, refresh=True)
+    assert len(calls) == 2
+
+
+def test_memory_cache():
+    cache = MemoryCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    cache.invalidate(lambda key: key == "a")
+    assert cache.get("a") is None
+    assert cache.stats == {"hits": 2, "misses": 2, "evictions": 1}
+
+
+def test_frame_version():
+    df = test_df.copy()
+    version = frame_version(df)
+    assert frame_version(df) == version
+    assert frame_version(test_df.copy()) != version
+    del df
+    gc.collect()
+    assert frame_version(test_df.copy()) != version
+
+
+def test_dataset_version():
+    version = dataset_version({"protocol": "land_covers", "countries": []}, 1.5)
+    assert version == dataset_version({"countries": [], "protocol": "land_covers"}, 1.5)
+    assert version != dataset_version({"protocol": "land_covers", "countries": []}, 2.5)
+    assert dataset_version(version, ["a", "b"]) != dataset_version(version, ["a"])
+
+
+def test_arrow_storage(tmp_path):
+    cache = DatasetCache(str(tmp_path), storage="arrow")
+    df = test_df.assign(count=np.arange(len(test_df), dtype=np.int32))
+    stored = cache.put("a", df)
+    assert os.path.exists(os.path.join(str(tmp_path), "a.feather"))
+    assert df.equals(stored)
+    assert df.equals(cache.get("a"))
+    # Numeric columns are read-only views of the mapped file
+    assert not stored["count"].to_numpy().flags.writeable
+
+    with pytest.raises(ValueError):
+        DatasetCache(str(tmp_path), storage="csv")
+
+
+def test_filters_on_arrow_storage(tmp_path):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame.from_dict(
+        {
+            "mhm_Latitude": rng.choice([1.5, 2.0, -91.0, 45.25], 200),
+            "mhm_Longitude": rng.choice([1.5, 181.0, -3.75], 200),
+            "mhm_MGRSLatitude": rng.choice([1.5, 45.25, 3.5], 200),
+            "mhm_MGRSLongitude": rng.choice([1.5, -3.75, 7.0], 200),
+            "mhm_WaterSource": rng.choice(["pond", "lake", "container"], 200),
+        }
+    )
+    df = utils.optimize_dtypes(df)
+    mapped = DatasetCache(str(tmp_path), storage="arrow").put("a", df)
+    cleanup_args = [True, True, True, ["mhm_Latitude"], 2]
+    assert utils.apply_cleanup_filters(mapped, *cleanup_args).equals(
+        utils.apply_cleanup_filters(df, *cleanup_args)
+    )
+    filters = {
+        "pond": lambda data: utils.value_filter(
+            ["pond"], False, "mhm_WaterSource", data
+        ),
+        "north": lambda data: utils.numeric_filter(">", 2, "mhm_Latitude", data),
+    }
+    assert utils.apply_filters(mapped, filters, list(filters)).equals(
+        utils.apply_filters(df, filters, list(filters))
+    )
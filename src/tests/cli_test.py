@@ -0,0 +1,108 @@
+import json
+import os
+import sys
+import threading
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cli  # noqa: E402
+
+test_df = pd.DataFrame.from_dict(
+    {
+        "mhm_Latitude": [38.5, 14.5, 10.0, -3.25],
+        "mhm_Longitude": [-77.0, 120.25, 179.5, 36.75],
+        "mhm_LarvaeCount": [5.0, 0.0, 12.0, 10.0],
+        "mhm_WaterSource": ["pond", "lake", "pond", "container"],
+    }
+)
+
+
+def write_metadata(directory, name, start_date, selected_filters):
+    path = os.path.join(directory, f"{name}.json")
+    metadata = {
+        "protocol": "Mosquito Habitat Mapper",
+        "start_date": start_date,
+        "end_date": "2021-12-25",
+        "countries": [],
+        "regions": [],
+        "selected_filters": selected_filters,
+        "selected_filter_types": ["numeric"] * len(selected_filters),
+    }
+    with open(path, "w") as f:
+        json.dump(metadata, f)
+    return path
+
+
+def test_run_batch_shares_downloads(tmp_path, monkeypatch):
+    downloads = []
+    lock = threading.Lock()
+
+    def fake_download_data(download_args, *args):
+        with lock:
+            downloads.append((download_args["start_date"], download_args["end_date"]))
+        return test_df
+
+    monkeypatch.setattr(cli, "download_data", fake_download_data)
+    paths = [
+        write_metadata(str(tmp_path), "a", "2017-05-31", ["mhm_LarvaeCount > 5.0"]),
+        write_metadata(str(tmp_path), "b", "2017-05-31", []),
+        write_metadata(str(tmp_path), "c", "2020-01-01", ["mhm_LarvaeCount < 1.0"]),
+    ]
+    output_dir = os.path.join(str(tmp_path), "out")
+    results = cli.run_batch(paths, output_dir, "csv", jobs=3, cache=None)
+
+    assert results == {paths[0]: 2, paths[1]: 4, paths[2]: 1}
+    assert sorted(downloads) == [
+        ("2017-05-31", "2021-12-25"),
+        ("2020-01-01", "2021-12-25"),
+    ]
+    output = pd.read_csv(os.path.join(output_dir, "a.csv"), index_col=0)
+    assert output.equals(test_df[test_df["mhm_LarvaeCount"] > 5])
+
+
+def test_run_batch_reports_failures(tmp_path, monkeypatch):
+    def failing_download_data(download_args, *args):
+        raise RuntimeError("Failed to get data from the API.")
+
+    monkeypatch.setattr(cli, "download_data", failing_download_data)
+    path = write_metadata(str(tmp_path), "a", "2017-05-31", [])
+    missing = os.path.join(str(tmp_path), "missing.json")
+    assert cli.main([path, missing, "-o", str(tmp_path), "--no-cache"]) == 1
+    results = cli.run_batch([path, missing], str(tmp_path), cache=None)
+    assert isinstance(results[path], RuntimeError)
+    assert isinstance(results[missing], OSError)
+    assert not os.path.exists(os.path.join(str(tmp_path), "a.csv"))
+
+
+def test_run_batch_same_names(tmp_path, monkeypatch):
+    monkeypatch.setattr(cli, "download_data", lambda download_args, *args: test_df)
+    first, second = tmp_path / "a", tmp_path / "b"
+    first.mkdir()
+    second.mkdir()
+    paths = [
+        write_metadata(str(first), "mhm", "2017-05-31", ["mhm_LarvaeCount > 5.0"]),
+        write_metadata(str(second), "mhm", "2017-05-31", []),
+    ]
+    output_dir = os.path.join(str(tmp_path), "out")
+    assert cli.run_batch(paths, output_dir, "csv", jobs=2, cache=None) == {
+        paths[0]: 2,
+        paths[1]: 4,
+    }
+    assert sorted(os.listdir(output_dir)) == ["mhm-2.csv", "mhm.csv"]
+    assert len(pd.read_csv(os.path.join(output_dir, "mhm-2.csv"))) == 4
+
+
+def test_process_query_removes_partial_output(tmp_path, monkeypatch):
+    def failing_export(df, file, export_format):
+        file.write(b"partial")
+        raise ValueError("Unsupported export format")
+
+    monkeypatch.setattr(cli, "export_data", failing_export)
+    path = write_metadata(str(tmp_path), "a", "2017-05-31", [])
+    destination = os.path.join(str(tmp_path), "out.csv")
+    with pytest.raises(ValueError):
+        cli.process_query(cli.load_query(path), test_df, destination, "csv")
+    assert sorted(os.listdir(str(tmp_path))) == ["a.json"]
@@ -0,0 +1,122 @@
+import gzip
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from export import export_data, export_to_file, remove_old_exports  # noqa: E402
+from utils import optimize_dtypes  # noqa: E402
+from views import RowView, restore_dtypes  # noqa: E402
+
+test_df = pd.DataFrame.from_dict(
+    {
+        "mhm_Latitude": np.linspace(-80, 80, 25),
+        "mhm_WaterSource": pd.Categorical(["pond", "lake", None, "pond", "lake"] * 5),
+        "mhm_LarvaeCount": np.arange(25, dtype=np.float32),
+        "mhm_measuredDate": pd.date_range("2021-01-01", periods=25),
+        "mhm_GLOBETeams": [["SEES2021", "X"], [], None, ["Y"], ["SEES2020"]] * 5,
+    },
+).iloc[3:]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 100])
+def test_csv_export_matches_to_csv(chunk_size):
+    buffer = io.BytesIO()
+    export_data(test_df, buffer, "csv", chunk_size)
+    assert buffer.getvalue() == test_df.to_csv().encode("utf-8")
+
+    buffer = io.BytesIO()
+    export_data(test_df, buffer, "csv.gz", chunk_size)
+    assert gzip.decompress(buffer.getvalue()) == test_df.to_csv().encode("utf-8")
+
+
+@pytest.mark.parametrize(
+    "export_format, reader",
+    [("parquet", pd.read_parquet), ("feather", pd.read_feather)],
+)
+@pytest.mark.parametrize("chunk_size", [1, 7, 100])
+def test_columnar_export_roundtrip(tmp_path, export_format, reader, chunk_size):
+    path = export_to_file(test_df, export_format, str(tmp_path), chunk_size)
+    df = reader(path)
+    # Optimized dtypes are exported as the original ones
+    assert df.drop(columns="mhm_GLOBETeams").equals(
+        restore_dtypes(test_df).drop(columns="mhm_GLOBETeams")
+    )
+    assert [
+        list(teams) if teams is not None else None for teams in df["mhm_GLOBETeams"]
+    ] == list(test_df["mhm_GLOBETeams"])
+
+
+@pytest.mark.parametrize(
+    "export_format, reader",
+    [("csv", pd.read_csv), ("parquet", pd.read_parquet), ("feather", pd.read_feather)],
+)
+def test_optimized_export_matches_original(tmp_path, export_format, reader):
+    original = pd.DataFrame.from_dict(
+        {
+            "mhm_WaterSource": ["pond", "lake", None, "pond", "tire"] * 10,
+            "mhm_Genus": [None] * 40 + ["Aedes"] * 10,
+            "mhm_LarvaeCount": np.arange(50, dtype=np.float64),
+            "mhm_PhotoCount": np.arange(50),
+        }
+    )
+    optimized = optimize_dtypes(original, category_max_ratio=0.5)
+    assert optimized["mhm_Genus"].dtype == "category"
+    # Filters remove the "tire" category from the exported rows
+    rows = original["mhm_WaterSource"] != "tire"
+    paths = [
+        export_to_file(df[rows.to_numpy()], export_format, str(tmp_path), 7)
+        for df in (original, optimized)
+    ]
+    if export_format == "csv":
+        with open(paths[0], "rb") as expected, open(paths[1], "rb") as exported:
+            assert exported.read() == expected.read()
+    elif export_format == "parquet":
+        assert pq.read_schema(paths[1]).equals(pq.read_schema(paths[0]))
+    else:
+        schemas = [pa.ipc.open_file(path).schema for path in paths]
+        assert schemas[1].equals(schemas[0])
+    pd.testing.assert_frame_equal(reader(paths[1]), reader(paths[0]))
+
+
+@pytest.mark.parametrize("export_format", ["csv", "parquet", "feather"])
+def test_row_view_export_streams_rows(tmp_path, monkeypatch, export_format):
+    positions = [20, 3, 7, 8, 15]
+    expected = export_to_file(
+        test_df.take(positions), export_format, str(tmp_path), chunk_size=2
+    )
+
+    def copy_all_rows(view):
+        raise AssertionError("the whole view was copied")
+
+    monkeypatch.setattr(RowView, "to_frame", copy_all_rows)
+    path = export_to_file(
+        RowView(test_df, positions), export_format, str(tmp_path), chunk_size=2
+    )
+    with open(path, "rb") as exported, open(expected, "rb") as f:
+        assert exported.read() == f.read()
+
+
+def test_export_empty_frame(tmp_path):
+    path = export_to_file(test_df.iloc[:0], "csv", str(tmp_path))
+    with open(path, "rb") as f:
+        assert f.read() == test_df.iloc[:0].to_csv().encode("utf-8")
+
+
+def test_remove_old_exports(tmp_path):
+    path = export_to_file(test_df, "csv", str(tmp_path))
+    os.utime(path, (0, 0))
+    remove_old_exports(str(tmp_path))
+    assert not os.path.exists(path)
+
+
+def test_unsupported_export_format():
+    with pytest.raises(ValueError):
+        export_data(test_df, io.BytesIO(), "xlsx")
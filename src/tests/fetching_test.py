@@ -0,0 +1,290 @@
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fetching  # noqa: E402
+from cache import DatasetCache, dataset_key  # noqa: E402
+from constants import recent_partition_ttl, request_timeout  # noqa: E402
+from fetching import (  # noqa: E402
+    fetch_partition,
+    fetch_partitioned_data,
+    is_recent_partition,
+    is_recent_range,
+    merge_partitions,
+    partition_date_range,
+    trim_to_date_range,
+)
+from utils import download_data  # noqa: E402
+
+partition_test_values = [
+    (
+        "2021-01-01",
+        "2021-03-31",
+        [
+            ("2021-01-01", "2021-01-31"),
+            ("2021-02-01", "2021-02-28"),
+            ("2021-03-01", "2021-03-31"),
+        ],
+    ),
+    (
+        "2017-05-31",
+        "2017-06-02",
+        [("2017-05-01", "2017-05-31"), ("2017-06-01", "2017-06-30")],
+    ),
+    ("2020-02-10", "2020-02-12", [("2020-02-01", "2020-02-29")]),
+]
+
+recent_test_values = [
+    ("2021-12-31", datetime.date(2022, 1, 15), True),
+    ("2021-11-30", datetime.date(2022, 1, 15), False),
+    ("2022-01-31", datetime.date(2022, 1, 15), True),
+]
+
+
+@pytest.mark.parametrize("start_date, end_date, partitions", partition_test_values)
+def test_partition_date_range(start_date, end_date, partitions):
+    assert partition_date_range(start_date, end_date) == partitions
+
+
+@pytest.mark.parametrize("partition_end, today, recent", recent_test_values)
+def test_recent_partition(partition_end, today, recent):
+    assert is_recent_partition(partition_end, today) == recent
+
+
+def test_trim_to_date_range():
+    df = pd.DataFrame.from_dict(
+        {
+            "measuredDate": pd.to_datetime(
+                ["2017-05-01", "2017-05-30", "2017-05-31", None]
+            ),
+            "latitude": [1.0, 2.0, 3.0, 4.0],
+        }
+    )
+    trimmed = trim_to_date_range(df, "2017-05-31", "2017-06-30")
+    assert list(trimmed["latitude"]) == [3.0, 4.0]
+
+
+def fake_raw_data(calls):
+    def fetch(protocol, start_date, end_date, api_url):
+        calls.append(start_date)
+        dates = pd.date_range(start_date, end_date, freq="10D")
+        return pd.DataFrame.from_dict(
+            {"measuredDate": dates, "latitude": range(len(dates))}
+        )
+
+    return fetch
+
+
+def test_fetch_partitioned_data(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(fetching, "fetch_raw_data", fake_raw_data(calls))
+    monkeypatch.setattr(fetching, "default_data_clean", lambda df, protocol: df)
+    cache = DatasetCache(str(tmp_path))
+
+    df = fetch_partitioned_data("land_covers", "2021-01-15", "2021-03-10", cache)
+    assert sorted(calls) == ["2021-01-01", "2021-02-01", "2021-03-01"]
+    assert df["measuredDate"].min() >= pd.Timestamp("2021-01-15")
+    assert df["measuredDate"].max() <= pd.Timestamp("2021-03-10")
+    assert df.index.equals(pd.RangeIndex(len(df)))
+
+    # Widening the window only downloads the new partitions
+    wide_df = fetch_partitioned_data("land_covers", "2020-12-01", "2021-03-10", cache)
+    assert calls[3:] == ["2020-12-01"]
+    assert (
+        wide_df[wide_df["measuredDate"] >= "2021-01-15"]
+        .reset_index(drop=True)
+        .equals(df)
+    )
+
+    # Historic partitions are kept when refreshing recent data
+    fetch_partitioned_data(
+        "land_covers", "2020-12-01", "2021-03-10", cache, refresh_recent=True
+    )
+    assert len(calls) == 4
+    fetch_partitioned_data(
+        "land_covers", "2020-12-01", "2021-03-10", cache, refresh=True
+    )
+    assert len(calls) == 8
+
+
+def test_recent_range():
+    today = datetime.date(2022, 3, 10)
+    assert is_recent_range("2021-01-01", "2022-03-01", today)
+    assert not is_recent_range("2021-01-01", "2021-12-31", today)
+
+
+def test_download_data_refreshes_recent_months(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(fetching, "fetch_raw_data", fake_raw_data(calls))
+    monkeypatch.setattr(fetching, "default_data_clean", lambda df, protocol: df)
+    cache = DatasetCache(str(tmp_path))
+    today = datetime.date.today()
+    download_args = {
+        "protocol": "land_covers",
+        "start_date": (today - datetime.timedelta(days=90)).strftime("%Y-%m-%d"),
+        "end_date": today.strftime("%Y-%m-%d"),
+        "countries": [],
+        "regions": [],
+    }
+    partitions = partition_date_range(
+        download_args["start_date"], download_args["end_date"]
+    )
+    download_data(dict(download_args), cache, workers=1)
+    download_data(dict(download_args), cache, workers=1)
+    assert len(calls) == len(partitions)
+    # No whole-request entry outlives the recent partitions
+    assert cache.get(dataset_key(**download_args)) is None
+
+    # Once the recent partitions expired, only they are downloaded again
+    expired = time.time() - recent_partition_ttl - 1
+    for name in os.listdir(tmp_path):
+        os.utime(os.path.join(tmp_path, name), (expired, expired))
+    download_data(dict(download_args), cache, workers=1)
+    assert sorted(calls[len(partitions) :]) == [
+        start for start, end in partitions if is_recent_partition(end)
+    ]
+    assert len(calls) < 2 * len(partitions)
+
+
+class FakeResponse:
+    content = b"{}"
+
+    def __bool__(self):
+        return True
+
+    def json(self):
+        return {
+            "results": [
+                {
+                    "protocol": "tree_heights",
+                    "measuredDate": "2021-01-05",
+                    "latitude": 1.5,
+                    "data": {"treeheightsHeight": 2.0},
+                }
+            ]
+        }
+
+
+def test_fetch_partition_retries_timeouts(monkeypatch):
+    timeouts = []
+
+    def get(url, params, timeout):
+        timeouts.append(timeout)
+        if len(timeouts) == 1:
+            raise requests.Timeout()
+        return FakeResponse()
+
+    monkeypatch.setattr(fetching.requests, "get", get)
+    monkeypatch.setattr(fetching, "retry_backoff", 0)
+    df = fetch_partition("tree_heights", "2021-01-01", "2021-01-31")
+    assert timeouts == [request_timeout, request_timeout]
+    assert len(df) == 1
+
+
+@pytest.mark.parametrize("status_code, attempts", [(503, 3), (400, 1)])
+def test_fetch_partition_retries_server_errors(monkeypatch, status_code, attempts):
+    responses = []
+
+    class FailedResponse:
+        def __init__(self):
+            self.status_code = status_code
+
+        def __bool__(self):
+            return False
+
+    def get(url, params, timeout):
+        responses.append(FailedResponse())
+        return responses[-1]
+
+    monkeypatch.setattr(fetching.requests, "get", get)
+    monkeypatch.setattr(fetching, "retry_backoff", 0)
+    # Only server errors can succeed when retried, others fail straight away
+    with pytest.raises(RuntimeError):
+        fetch_partition("tree_heights", "2021-01-01", "2021-01-31", retries=2)
+    assert len(responses) == attempts
+
+
+observation_dates = pd.date_range("2020-11-20", "2021-04-10", freq="3D")
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    failures = {}
+
+    def do_GET(self):
+        query = {
+            key: value[0] for key, value in parse_qs(urlparse(self.path).query).items()
+        }
+        # Every partition fails once to exercise the retries
+        if self.failures.setdefault(query["startdate"], 0) < 1:
+            self.failures[query["startdate"]] += 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        results = [
+            {
+                "protocol": query["protocols"],
+                "measuredDate": date.strftime("%Y-%m-%d"),
+                "latitude": float(index),
+                "data": {"treeheightsHeight": index * 0.5},
+            }
+            for index, date in enumerate(observation_dates)
+            if query["startdate"] <= date.strftime("%Y-%m-%d") <= query["enddate"]
+        ]
+        body = json.dumps({"results": results}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in_url():
+    StandInHandler.failures = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+
+
+@pytest.mark.parametrize("workers", [2, 4, 8])
+def test_parallel_matches_serial(stand_in_url, monkeypatch, workers):
+    monkeypatch.setattr(fetching, "retry_backoff", 0)
+    args = ("tree_heights", "2020-12-03", "2021-03-28")
+    serial_df = fetch_partitioned_data(*args, workers=1, api_url=stand_in_url)
+    parallel_df = fetch_partitioned_data(*args, workers=workers, api_url=stand_in_url)
+    assert serial_df.equals(parallel_df)
+    assert list(serial_df["measuredDate"]) == [
+        date for date in observation_dates if "2020-12-03" <= str(date) <= "2021-03-28"
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_partitioned_matches_single_request(stand_in_url, monkeypatch, workers):
+    monkeypatch.setattr(fetching, "retry_backoff", 0)
+    # The first and last months of the range have no observations
+    args = ("tree_heights", "2020-09-15", "2021-06-20")
+    single_df = merge_partitions(
+        [fetch_partition(*args, api_url=stand_in_url)], args[0]
+    )
+    partitioned_df = fetch_partitioned_data(
+        *args, workers=workers, api_url=stand_in_url
+    )
+    pd.testing.assert_frame_equal(partitioned_df, single_df)
+    assert partitioned_df.index.equals(single_df.index)
+    assert list(partitioned_df["measuredDate"]) == list(observation_dates)
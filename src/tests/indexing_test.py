@@ -0,0 +1,119 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexing import (  # noqa: E402
+    GridIndex,
+    InvertedIndex,
+    get_grid_index,
+    get_inverted_index,
+    points_in_polygon,
+)
+
+teams = pd.Series(
+    [
+        ["SEES2020", "ABC"],
+        ["SEES2021", "X", "SEES2021"],
+        np.nan,
+        [],
+        ["SEES2020", "SEES2021"],
+        "SEES2022",
+    ]
+)
+
+inverted_index_test_values = [
+    (["SEES2020"], False, [True, False, False, False, True, False]),
+    (["SEES2020", "X"], False, [True, True, False, False, True, False]),
+    (["SEES2022"], False, [False, False, False, False, False, False]),
+    (["SEES2020"], True, [False, True, False, True, False, False]),
+    ([], True, [True, True, True, True, True, True]),
+    (["Missing"], True, [True, True, False, True, True, False]),
+]
+
+
+def test_inverted_index_postings():
+    index = InvertedIndex(teams)
+    assert sorted(index.values) == ["ABC", "SEES2020", "SEES2021", "X"]
+    assert list(index.postings["SEES2021"]) == [1, 4]
+    assert list(index.positions(["ABC", "SEES2021"])) == [0, 1, 4]
+
+
+def test_inverted_index_values_in():
+    index = InvertedIndex(teams)
+    assert sorted(index.values_in(np.array([1, 2, 3], dtype=np.int32))) == [
+        "SEES2021",
+        "X",
+    ]
+    assert index.values_in(np.array([], dtype=np.int32)) == []
+
+
+@pytest.mark.parametrize("values, exclude, desired", inverted_index_test_values)
+def test_inverted_index_mask(values, exclude, desired):
+    assert list(InvertedIndex(teams).mask(values, exclude)) == desired
+
+
+def test_inverted_index_is_built_once():
+    df = pd.DataFrame({"mhm_GLOBETeams": teams})
+    assert get_inverted_index(df, "mhm_GLOBETeams") is get_inverted_index(
+        df, "mhm_GLOBETeams"
+    )
+    assert get_inverted_index(df, "mhm_GLOBETeams") is not get_inverted_index(
+        df.copy(), "mhm_GLOBETeams"
+    )
+
+
+rng = np.random.default_rng(0)
+latitudes = np.concatenate([rng.uniform(-90, 90, 2000), [np.nan, -9999, 45.0, 90.0]])
+longitudes = np.concatenate([rng.uniform(-180, 180, 2000), [0.0, 0.0, 181.0, 180.0]])
+
+bbox_test_values = [
+    (-10.0, -20.0, 10.0, 20.0),
+    (-10.5, -20.25, 10.5, 20.25),
+    (-90.0, -180.0, 90.0, 180.0),
+    (30.0, 170.0, 60.0, -170.0),
+    (0.0, 0.0, 0.0, 0.0),
+]
+
+
+@pytest.mark.parametrize("bbox", bbox_test_values)
+@pytest.mark.parametrize("cell_size", [1.0, 7.0])
+def test_grid_index_bbox(bbox, cell_size):
+    min_lat, min_lon, max_lat, max_lon = bbox
+    in_lat = (latitudes >= min_lat) & (latitudes <= max_lat)
+    if min_lon > max_lon:
+        in_lon = (longitudes >= min_lon) | (longitudes <= max_lon)
+    else:
+        in_lon = (longitudes >= min_lon) & (longitudes <= max_lon)
+    expected = in_lat & in_lon & (np.abs(longitudes) <= 180)
+    index = GridIndex(latitudes, longitudes, cell_size)
+    assert np.array_equal(index.bbox_mask(*bbox), expected)
+
+
+def test_grid_index_polygon():
+    triangle = [[0.0, 0.0], [40.0, 10.0], [0.0, 60.0]]
+    index = GridIndex(latitudes, longitudes)
+    mask = index.polygon_mask(triangle)
+    assert np.array_equal(mask, points_in_polygon(latitudes, longitudes, triangle))
+    # Only candidates from the triangle's bounding box are tested
+    assert mask.sum() > 0
+    assert np.all(latitudes[mask] <= 40) and np.all(longitudes[mask] <= 60)
+
+
+def test_points_in_polygon():
+    square = [[0, 0], [0, 10], [10, 10], [10, 0]]
+    inside = points_in_polygon(
+        np.array([5.0, 5.0, 15.0, -1.0]), np.array([5.0, 11.0, 5.0, 5.0]), square
+    )
+    assert inside.tolist() == [True, False, False, False]
+
+
+def test_grid_index_cache():
+    df = pd.DataFrame({"lat": ["10.5", 20.0], "lon": [5.0, 6.0]})
+    index = get_grid_index(df, "lat", "lon")
+    assert get_grid_index(df, "lat", "lon") is index
+    assert index.bbox_mask(10, 0, 11, 10).tolist() == [True, False]
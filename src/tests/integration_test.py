@@ -10,7 +10,10 @@ import pytest
 from go_utils.constants import abbreviation_dict
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fetching  # noqa: E402
+from cache import DatasetCache  # noqa: E402
 from constants import date_fmt, default_cleanup_dict, protocols  # noqa: E402
+from standin import run_stand_in  # noqa: E402
 from utils import (  # noqa: E402
     apply_cleanup_filters,
     apply_filters,
@@ -21,6 +24,24 @@ from utils import (  # noqa: E402
 
 default_cleanup_params = copy.deepcopy(default_cleanup_dict)
 
+# GLOBE API responses replayed by the stand-in (see standin.py)
+recordings_dir = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "test_data", "recordings"
+)
+# Country downloads come from ArcGIS, which the stand-in cannot replay
+live_api = os.environ.get("GLOBE_LIVE_TESTS") == "1"
+requires_live_api = pytest.mark.skipif(
+    not live_api, reason="country downloads need the live API (GLOBE_LIVE_TESTS=1)"
+)
+
+
+@pytest.fixture
+def replayed_api(monkeypatch):
+    """Serves GLOBE API requests from the recordings instead of the live API."""
+    with run_stand_in(recordings_dir) as server:
+        monkeypatch.setattr(fetching, "globe_api_url", server.url)
+        yield server
+
 
 test_values = [
     (
@@ -230,20 +251,26 @@ def test_files(input_json, input_data, cleanup_args, condition):
 
 
 raw_data_values = [
-    {
-        "protocol": "Mosquito Habitat Mapper",
-        "start_date": datetime.date(2017, 5, 31),
-        "end_date": datetime.date(2021, 12, 25),
-        "countries": ["Brazil"],
-        "regions": ["North America", "Africa"],
-    },
-    {
-        "protocol": "Land Cover",
-        "start_date": datetime.date(2017, 5, 31),
-        "end_date": datetime.date(2021, 12, 25),
-        "countries": ["Thailand"],
-        "regions": [],
-    },
+    pytest.param(
+        {
+            "protocol": "Mosquito Habitat Mapper",
+            "start_date": datetime.date(2017, 5, 31),
+            "end_date": datetime.date(2021, 12, 25),
+            "countries": ["Brazil"],
+            "regions": ["North America", "Africa"],
+        },
+        marks=requires_live_api,
+    ),
+    pytest.param(
+        {
+            "protocol": "Land Cover",
+            "start_date": datetime.date(2017, 5, 31),
+            "end_date": datetime.date(2021, 12, 25),
+            "countries": ["Thailand"],
+            "regions": [],
+        },
+        marks=requires_live_api,
+    ),
     {
         "protocol": "Mosquito Habitat Mapper",
         "start_date": datetime.date(2017, 5, 31),
@@ -255,7 +282,7 @@ raw_data_values = [
 
 
 @pytest.mark.parametrize("input_json", raw_data_values)
-def test_raw_data_download(input_json):
+def test_raw_data_download(input_json, replayed_api, tmp_path):
     # Add blank selected filters to json to match formatting
     input_json["selected_filters"] = []
     input_json["selected_filter_types"] = []
@@ -283,7 +310,8 @@ def test_raw_data_download(input_json):
     update_data_args(
         metadata, download_args, selected_filter_list, cleanup_filters, filter_func_dict
     )
-    df = download_data(download_args)
+    df = download_data(download_args, cache=DatasetCache(str(tmp_path)))
+    assert len(df) > 0
 
     # Presence of COUNTRY column indicates the country-enriched dataset was used
     prefix = abbreviation_dict[download_args["protocol"]]
@@ -292,5 +320,6 @@ def test_raw_data_download(input_json):
         assert country_col in df.columns
     else:
         assert country_col not in df.columns
+        assert replayed_api.stats["missing"] == 0
     # Cleanup JSON
     os.remove(json_dir)
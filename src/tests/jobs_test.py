@@ -0,0 +1,157 @@
+import datetime
+import os
+import sys
+import threading
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fetching  # noqa: E402
+from cache import DatasetCache  # noqa: E402
+from jobs import DownloadJob  # noqa: E402
+from profiling import Profiler, deactivate, span  # noqa: E402
+from store import DatasetStore  # noqa: E402
+
+download_args = {
+    "protocol": "land_covers",
+    "start_date": datetime.date(2021, 1, 1),
+    "end_date": datetime.date(2021, 6, 30),
+    "countries": [],
+    "regions": [],
+}
+
+
+@pytest.fixture
+def gated_fetch(monkeypatch):
+    """Replaces the GLOBE API with partitions that are only returned once released."""
+    released = threading.Semaphore(0)
+    calls = []
+
+    def fetch(protocol, start_date, end_date, api_url):
+        released.acquire()
+        calls.append(start_date)
+        dates = pd.date_range(start_date, end_date, freq="10D")
+        df = pd.DataFrame.from_dict(
+            {"measuredDate": dates, "latitude": range(len(dates))}
+        )
+        df.attrs["response_bytes"] = 100
+        return df
+
+    monkeypatch.setattr(fetching, "fetch_raw_data", fetch)
+    monkeypatch.setattr(fetching, "default_data_clean", lambda df, protocol: df)
+    return released, calls
+
+
+def test_download_job_progress(tmp_path, gated_fetch):
+    released, calls = gated_fetch
+    job = DownloadJob(download_args, cache=DatasetCache(str(tmp_path)), workers=1)
+    job.start()
+    assert job.status == "running"
+    for _ in range(6):
+        released.release()
+    job.join(5)
+    assert job.status == "done"
+    assert job.fraction == 1.0
+    assert job.progress == {
+        "completed": 6,
+        "total": 6,
+        "rows": len(job.result),
+        "bytes": 600,
+    }
+    # The session's arguments are left untouched
+    assert download_args["start_date"] == datetime.date(2021, 1, 1)
+
+
+def test_download_job_cancel(tmp_path, gated_fetch):
+    released, calls = gated_fetch
+    job = DownloadJob(download_args, cache=DatasetCache(str(tmp_path)), workers=1)
+    job.start()
+    released.release()
+    job.cancel()
+    released.release()
+    job.join(5)
+    assert job.status == "cancelled"
+    assert job.result is None
+    # The partition in flight finishes, the remaining ones are never requested
+    assert len(calls) <= 2
+
+
+def test_download_job_profiles_download(tmp_path, gated_fetch):
+    released, calls = gated_fetch
+    job = DownloadJob(
+        download_args,
+        profiler=Profiler(enabled=True, log=False),
+        cache=DatasetCache(str(tmp_path)),
+        workers=1,
+    ).start()
+    for _ in range(6):
+        released.release()
+    job.join(5)
+    assert job.status == "done"
+
+    # The session merges the job's spans into the rerun swapping in its result
+    session = Profiler(enabled=True, log=False)
+    session.activate()
+    try:
+        with span("rerun"):
+            session.merge(job.profiler.spans)
+    finally:
+        deactivate()
+    stages = [(entry["stage"], entry["depth"]) for entry in session.spans]
+    assert stages[:2] == [("rerun", 0), ("download", 1)]
+    for stage in ("fetch", "cache lookup", "optimize dtypes", "cache store"):
+        assert stage in [name for name, depth in stages if depth > 1]
+
+
+def test_download_job_failure(tmp_path, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("Failed to get data from the API.")
+
+    monkeypatch.setattr(fetching, "fetch_raw_data", fail)
+    monkeypatch.setattr(fetching, "retry_backoff", 0)
+    job = DownloadJob(download_args, cache=None, workers=2).start()
+    job.join(5)
+    assert job.status == "failed"
+    assert isinstance(job.error, RuntimeError)
+
+
+def test_download_jobs_share_store(tmp_path, gated_fetch):
+    released, calls = gated_fetch
+    store = DatasetStore()
+    jobs = [
+        DownloadJob(download_args, store=store, cache=None, workers=1).start()
+        for _ in range(3)
+    ]
+    # Without a cache the whole range is downloaded in a single request
+    released.release()
+    for job in jobs:
+        job.join(5)
+    assert [job.status for job in jobs] == ["done"] * 3
+    assert len(calls) == 1
+    assert jobs[1].result is jobs[0].result
+    assert store.stats["loads"] == 1
+    # Jobs sharing the download receive its progress
+    assert [job.progress for job in jobs] == [jobs[0].progress] * 3
+    assert jobs[0].fraction == 1.0
+
+
+def test_single_request_job_progress_and_cancel(gated_fetch):
+    released, calls = gated_fetch
+    job = DownloadJob(download_args, cache=None, workers=1).start()
+    released.release()
+    job.join(5)
+    assert job.status == "done"
+    assert job.progress == {
+        "completed": 1,
+        "total": 1,
+        "rows": len(job.result),
+        "bytes": 100,
+    }
+
+    cancelled = DownloadJob(download_args, cache=None, workers=1)
+    cancelled.cancel()
+    cancelled.start().join(5)
+    assert cancelled.status == "cancelled"
+    assert len(calls) == 1
@@ -0,0 +1,55 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mapping import aggregate_points, fit_grid, grid_aggregate, grid_cells  # noqa: E402
+
+test_df = pd.DataFrame.from_dict(
+    {
+        "mhm_Latitude": [38.5, 38.501, 38.502, -14.5, np.nan, -9999.0],
+        "mhm_Longitude": [-77.0, -77.001, -77.002, 120.25, 10.0, 10.0],
+    }
+)
+
+
+def test_points_within_budget():
+    points, mode = aggregate_points(test_df, "mhm_Latitude", "mhm_Longitude", 10)
+    assert mode == "points"
+    assert points["latitude"].tolist() == [38.5, 38.501, 38.502, -14.5]
+    assert points["count"].sum() == 4
+
+
+def test_heatmap_above_budget():
+    points, mode = aggregate_points(test_df, "mhm_Latitude", "mhm_Longitude", 2)
+    assert mode == "heatmap"
+    assert points["count"].tolist() == [1, 3]
+    assert points["latitude"].tolist() == pytest.approx([-14.5, 38.501])
+    assert points["longitude"].tolist() == pytest.approx([120.25, -77.001])
+
+
+@pytest.mark.parametrize("budget", [1, 10, 100, 1000])
+def test_grid_aggregate_fits_budget(budget):
+    rng = np.random.default_rng(0)
+    latitudes = rng.uniform(-90, 90, 5000)
+    longitudes = rng.uniform(-180, 180, 5000)
+    aggregated = grid_aggregate(latitudes, longitudes, budget)
+    assert len(aggregated) <= budget
+    assert aggregated["count"].sum() == 5000
+
+    # Every point lies in the cell whose mean it contributes to
+    cell_size = aggregated.attrs["cell_size"]
+    rows, cols = grid_cells(latitudes, longitudes, cell_size)
+    cell_rows, cell_cols = grid_cells(
+        aggregated["latitude"].to_numpy(), aggregated["longitude"].to_numpy(), cell_size
+    )
+    assert set(zip(rows, cols)) == set(zip(cell_rows, cell_cols))
+
+
+def test_fit_grid_rejects_empty_budget():
+    with pytest.raises(ValueError):
+        fit_grid(np.array([1]), np.array([1]), 0)
@@ -0,0 +1,101 @@
+import os
+import resource
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import MemoryCache  # noqa: E402
+from plotting import get_plots, render_figures  # noqa: E402
+from utils import optimize_dtypes  # noqa: E402
+from views import RowView  # noqa: E402
+
+test_df = pd.DataFrame({"mhm_LarvaeCount": np.arange(1000) % 17})
+calls = []
+
+
+def example_plots(df):
+    calls.append(len(df))
+    for bins in (5, 10):
+        plt.figure(figsize=(4, 3))
+        plt.hist(df["mhm_LarvaeCount"], bins=bins)
+
+
+def test_render_figures_closes_figures():
+    images = render_figures(example_plots, test_df)
+    assert len(images) == 2
+    assert all(image.startswith(b"\x89PNG") for image in images)
+    assert plt.get_fignums() == []
+
+
+def test_render_figures_concurrently():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(
+            executor.map(lambda _: render_figures(example_plots, test_df), range(8))
+        )
+    assert [len(images) for images in results] == [2] * 8
+    assert plt.get_fignums() == []
+
+
+def test_render_figures_keeps_existing_figures():
+    existing = plt.figure()
+    try:
+        render_figures(example_plots, test_df)
+        assert plt.get_fignums() == [existing.number]
+    finally:
+        plt.close(existing)
+
+
+def test_get_plots_skips_unchanged_data():
+    calls.clear()
+    cache = MemoryCache(4)
+    images = get_plots(example_plots, test_df, "v1", cache)
+    assert get_plots(example_plots, test_df, "v1", cache) is images
+    get_plots(example_plots, test_df, "v2", cache)
+    assert calls == [1000, 1000]
+
+
+def test_optimized_plots_match_original():
+    original = pd.DataFrame.from_dict(
+        {
+            "mhm_Genus": ["Aedes", "Culex", None, "Aedes", "Other"] * 10,
+            "mhm_LarvaeCount": np.arange(50, dtype=np.float64),
+        }
+    )
+    optimized = optimize_dtypes(original, category_max_ratio=0.5)
+    assert optimized["mhm_Genus"].dtype == "category"
+    plotted = []
+
+    def genus_plot(df):
+        # Like go_utils.plotting.plot_freq_bar
+        plotted.append(df)
+        plt.figure()
+        df.groupby("mhm_Genus").size().plot.bar()
+
+    # The filtered rows have no "Other" genus
+    positions = np.flatnonzero(original["mhm_Genus"] != "Other")
+    for df in (original, optimized):
+        get_plots(genus_plot, RowView(df, positions), id(df), MemoryCache(4))
+    pd.testing.assert_frame_equal(plotted[1], plotted[0])
+    assert plotted[1].groupby("mhm_Genus").size().to_dict() == {
+        "Aedes": 20,
+        "Culex": 10,
+    }
+
+
+def test_reruns_keep_memory_flat():
+    cache = MemoryCache(4)
+    # Warm up matplotlib's font and renderer caches
+    for version in range(10):
+        get_plots(example_plots, test_df, f"warmup-{version}", cache)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for version in range(20):
+        get_plots(example_plots, test_df, f"rerun-{version}", cache)
+        assert plt.get_fignums() == []
+    # ru_maxrss is in KiB on Linux (and bytes on macOS, which only loosens the bound)
+    growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak_rss
+    assert growth < 16 * 1024
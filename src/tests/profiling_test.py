@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profiling import Profiler, deactivate, profiled, span  # noqa: E402
+from utils import apply_filters, numeric_filter  # noqa: E402
+
+
+@pytest.fixture
+def profiler():
+    profiler = Profiler(enabled=True)
+    profiler.activate()
+    yield profiler
+    deactivate()
+
+
+def test_nested_spans(profiler):
+    with span("outer", rows=3):
+        with span("inner") as entry:
+            entry["rows"] = 2
+    assert [(s["stage"], s["depth"], s["rows"]) for s in profiler.spans] == [
+        ("outer", 0, 3),
+        ("inner", 1, 2),
+    ]
+    assert profiler.spans[0]["seconds"] >= profiler.spans[1]["seconds"] >= 0
+    profiler.reset()
+    assert profiler.spans == []
+
+
+def test_profiled_functions(profiler):
+    df = pd.DataFrame({"mhm_LarvaeCount": [5, 0, 10]})
+    filters = {
+        "mhm_LarvaeCount > 1": lambda data: numeric_filter(
+            ">", 1, "mhm_LarvaeCount", data
+        )
+    }
+    apply_filters(df, filters, list(filters))
+    assert [s["stage"] for s in profiler.spans] == ["filters", "filter"]
+    assert profiler.spans[1]["name"] == "mhm_LarvaeCount > 1"
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler(enabled=False)
+    profiler.activate()
+
+    @profiled("stage")
+    def stage():
+        return 1
+
+    assert stage() == 1
+    with span("other"):
+        pass
+    assert profiler.spans == []
+
+
+def test_json_logs(caplog):
+    profiler = Profiler(enabled=True, log=True)
+    profiler.activate()
+    try:
+        with caplog.at_level(logging.INFO, logger="globe.profiling"):
+            with span("download", protocol="land_covers"):
+                pass
+    finally:
+        deactivate()
+    record = json.loads(caplog.records[0].getMessage())
+    assert record["stage"] == "download"
+    assert record["protocol"] == "land_covers"
+    assert {"seconds", "rss_delta_mb"} <= set(record)
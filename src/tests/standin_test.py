@@ -0,0 +1,119 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import pytest
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fetching  # noqa: E402
+from fetching import fetch_partition, fetch_partitioned_data  # noqa: E402
+from standin import recording_key, run_stand_in  # noqa: E402
+
+params = {
+    "protocols": "tree_heights",
+    "startdate": "2021-01-01",
+    "enddate": "2021-01-31",
+    "geojson": "FALSE",
+    "sample": "FALSE",
+}
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    requests = 0
+
+    def do_GET(self):
+        UpstreamHandler.requests += 1
+        query = dict(parse_qsl(urlparse(self.path).query))
+        results = [
+            {
+                "protocol": query["protocols"],
+                "measuredDate": query["startdate"],
+                "latitude": 10.0,
+                "data": {"treeheightsHeight": 2.5},
+            }
+        ]
+        body = json.dumps({"results": results}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream_url():
+    UpstreamHandler.requests = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), UpstreamHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_recording_key():
+    assert recording_key(params) == recording_key(dict(reversed(params.items())))
+    assert recording_key(params) != recording_key({**params, "enddate": "2021-02-01"})
+
+
+def test_record_then_replay(tmp_path, upstream_url):
+    with run_stand_in(str(tmp_path), upstream=upstream_url) as server:
+        recorded = requests.get(server.url, params=params)
+        assert recorded.ok
+        assert server.stats["recorded"] == 1
+    assert os.listdir(str(tmp_path)) == [recording_key(params) + ".json"]
+
+    # Replaying needs neither the upstream nor repeated upstream requests
+    with run_stand_in(str(tmp_path)) as server:
+        assert requests.get(server.url, params=params).content == recorded.content
+        missing = requests.get(server.url, params={**params, "enddate": "2021-02-01"})
+        assert missing.status_code == 404
+        assert server.stats["missing"] == 1
+    assert UpstreamHandler.requests == 1
+
+
+def test_injected_failures_and_latency(tmp_path, upstream_url, monkeypatch):
+    monkeypatch.setattr(fetching, "retry_backoff", 0)
+    with run_stand_in(str(tmp_path), upstream=upstream_url, fail_first=2) as server:
+        assert requests.get(server.url, params=params).status_code == 503
+        # The retries get past the remaining injected failure
+        df = fetch_partition(
+            "tree_heights", "2021-01-01", "2021-01-31", server.url, retries=1
+        )
+        assert len(df) == 1
+        assert server.stats["failures"] == 2
+
+    with run_stand_in(str(tmp_path), latency=0.2, bandwidth=10_000) as server:
+        start = time.perf_counter()
+        requests.get(server.url, params=params)
+        assert time.perf_counter() - start >= 0.2
+
+
+def test_failure_rate_is_reproducible(tmp_path):
+    def statuses():
+        with run_stand_in(str(tmp_path), failure_rate=0.5, seed=3) as server:
+            return [
+                requests.get(server.url, params=params).status_code for _ in range(20)
+            ]
+
+    first = statuses()
+    assert first == statuses()
+    assert 503 in first and 404 in first
+
+
+def test_partitioned_download_replays_offline(tmp_path, upstream_url):
+    args = ("tree_heights", "2021-01-01", "2021-03-31")
+    with run_stand_in(str(tmp_path), upstream=upstream_url) as server:
+        recorded = fetch_partitioned_data(*args, api_url=server.url)
+    with run_stand_in(str(tmp_path)) as server:
+        replayed = fetch_partitioned_data(*args, api_url=server.url)
+        assert server.stats["missing"] == 0
+    assert replayed.equals(recorded)
+    assert UpstreamHandler.requests == 3
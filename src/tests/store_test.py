@@ -0,0 +1,156 @@
+import gc
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fetching import DownloadCancelled  # noqa: E402
+from store import DatasetStore  # noqa: E402
+
+test_df = pd.DataFrame.from_dict({"latitude": [1.5, 2.5], "longitude": [3.5, 4.5]})
+
+
+def gated_load(released, calls, result=test_df, started=None):
+    def load(progress):
+        calls.append(1)
+        if started is not None:
+            started.set()
+        released.wait(5)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return load
+
+
+def test_store_single_flight():
+    store = DatasetStore()
+    released = threading.Event()
+    calls = []
+    load = gated_load(released, calls)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(store.lease, "a", load) for _ in range(4)]
+        released.set()
+        leases = [future.result() for future in futures]
+    assert len(calls) == 1
+    assert all(lease.data is test_df for lease in leases)
+    assert store.stats == {"loads": 1, "shared": 3, "evictions": 0}
+
+
+def test_store_eviction():
+    store = DatasetStore()
+    first = store.lease("a", lambda progress: test_df)
+    second = store.lease("a", lambda progress: test_df)
+    first.release()
+    first.release()
+    assert len(store) == 1
+    del second
+    gc.collect()
+    assert len(store) == 0
+    assert store.stats["evictions"] == 1
+
+
+def test_store_refresh():
+    store = DatasetStore()
+    old = store.lease("a", lambda progress: test_df)
+    new = store.lease("a", lambda progress: test_df.copy(), refresh=True)
+    assert new.data is not old.data
+    # Releasing the replaced dataset keeps the refreshed one
+    old.release()
+    assert store.lease("a", lambda progress: None).data is new.data
+
+
+def test_store_error():
+    store = DatasetStore()
+    released = threading.Event()
+    calls = []
+    load = gated_load(released, calls, RuntimeError("Failed to get data"))
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(store.lease, "a", load) for _ in range(2)]
+        released.set()
+        for future in futures:
+            with pytest.raises(RuntimeError):
+                future.result()
+    assert len(calls) == 1
+    assert len(store) == 0
+
+
+def test_store_cancelled_load_is_retried():
+    store = DatasetStore()
+    released = threading.Event()
+    started = threading.Event()
+    calls = []
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        owner = executor.submit(
+            store.lease,
+            "a",
+            gated_load(released, calls, DownloadCancelled(), started),
+        )
+        assert started.wait(5)
+        waiter = executor.submit(store.lease, "a", lambda progress: test_df)
+        released.set()
+        with pytest.raises(DownloadCancelled):
+            owner.result()
+        assert waiter.result().data is test_df
+
+
+def test_store_cancel_wait():
+    store = DatasetStore()
+    released = threading.Event()
+    cancel = threading.Event()
+    started = threading.Event()
+    calls = []
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        owner = executor.submit(
+            store.lease, "a", gated_load(released, calls, started=started)
+        )
+        assert started.wait(5)
+        waiter = executor.submit(
+            store.lease, "a", lambda progress: test_df, cancel=cancel
+        )
+        cancel.set()
+        with pytest.raises(DownloadCancelled):
+            waiter.result()
+        released.set()
+        lease = owner.result()
+    assert lease.data is test_df
+    lease.release()
+    assert len(store) == 0
+
+
+def test_store_forwards_progress():
+    store = DatasetStore()
+    released, started, joined = threading.Event(), threading.Event(), threading.Event()
+
+    def load(progress):
+        progress(1, 2, 10, 100)
+        started.set()
+        released.wait(5)
+        progress(2, 2, 5, 50)
+        return test_df
+
+    owner_reports, waiter_reports = [], []
+
+    def waiter_progress(*report):
+        waiter_reports.append(report)
+        joined.set()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        owner = executor.submit(
+            store.lease,
+            "a",
+            load,
+            progress=lambda *report: owner_reports.append(report),
+        )
+        assert started.wait(5)
+        waiter = executor.submit(store.lease, "a", load, progress=waiter_progress)
+        assert joined.wait(5)
+        released.set()
+        assert owner.result().data is waiter.result().data
+    assert owner_reports == [(1, 2, 10, 100), (2, 2, 5, 50)]
+    assert waiter_reports == owner_reports
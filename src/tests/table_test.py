@@ -0,0 +1,58 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import MemoryCache  # noqa: E402
+from table import get_page, get_sort_order, page_count, sort_order  # noqa: E402
+from views import RowView  # noqa: E402
+
+test_df = pd.DataFrame(
+    {
+        "mhm_LarvaeCount": [5.0, np.nan, 1.0, 5.0, 0.0],
+        "mhm_WaterSource": ["pond", "lake", None, "container", "pond"],
+        "mhm_GLOBETeams": [["B"], ["A"], np.nan, ["A", "C"], "X"],
+    },
+    index=[10, 11, 12, 13, 14],
+)
+
+sort_test_values = [
+    ("mhm_LarvaeCount", True, [4, 2, 0, 3, 1]),
+    ("mhm_LarvaeCount", False, [0, 3, 2, 4, 1]),
+    ("mhm_WaterSource", True, [3, 1, 0, 4, 2]),
+    ("mhm_GLOBETeams", True, [4, 3, 1, 0, 2]),
+    ("mhm_GLOBETeams", False, [0, 1, 3, 4, 2]),
+]
+
+
+@pytest.mark.parametrize("column, ascending, desired", sort_test_values)
+def test_sort_order(column, ascending, desired):
+    assert sort_order(test_df, column, ascending).tolist() == desired
+
+
+def test_get_page():
+    order = sort_order(test_df, "mhm_LarvaeCount")
+    assert get_page(test_df, 0, 2, order).index.tolist() == [14, 12]
+    assert get_page(test_df, 2, 2, order).index.tolist() == [11]
+    assert get_page(test_df, 1, 2).index.tolist() == [12, 13]
+    assert page_count(len(test_df), 2) == 3
+    assert page_count(0, 2) == 1
+
+
+def test_get_page_of_view():
+    view = RowView(test_df, [4, 0, 2, 1])
+    order = sort_order(view, "mhm_LarvaeCount")
+    assert order.tolist() == [0, 2, 1, 3]
+    assert get_page(view, 0, 3, order).index.tolist() == [14, 12, 10]
+    assert get_page(view, 1, 3).index.tolist() == [11]
+
+
+def test_sort_order_cache():
+    cache = MemoryCache(4)
+    order = get_sort_order(test_df, "mhm_LarvaeCount", True, "v1", cache)
+    assert get_sort_order(test_df, "mhm_LarvaeCount", True, "v1", cache) is order
+    assert cache.stats["hits"] == 1
@@ -0,0 +1,114 @@
+"""Generates the GLOBE API recordings replayed by the integration tests.
+
+The responses are synthetic Mosquito Habitat Mapper observations in the format of the
+GLOBE API, one recording per monthly partition of the tested date range:
+    python src/tests/test_data/make_recordings.py
+"""
+import json
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from fetching import partition_date_range  # noqa: E402
+from standin import Recordings, recording_key  # noqa: E402
+
+recordings_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+
+genera = [None, "Aedes", "Anopheles", "Culex", "Other"]
+water_sources = [
+    ("pond", "still: lake/pond/swamp"),
+    ("bucket", "container: artificial"),
+    ("tire", "container: artificial"),
+    ("puddle", "still: lake/pond/swamp"),
+    ("stream", "flowing: still water found next to river or stream"),
+]
+larvae_counts = [None, "0", "3", "12", "1-25", "26-100", "more than 100"]
+
+
+def observation(rng, date, number):
+    latitude = round(rng.uniform(-40, 50), 4)
+    longitude = round(rng.uniform(-120, 140), 4)
+    water_source, water_source_type = rng.choice(water_sources)
+
+    def photo(kind):
+        if rng.random() >= 0.6:
+            return None
+        path = date.replace("-", "/")
+        return (
+            f"https://data.globe.gov/system/photos/{path}/{number}{kind}/original.jpg"
+        )
+
+    return {
+        "protocol": "mosquito_habitat_mapper",
+        "measuredDate": date,
+        "createDate": f"{date}T12:00:00",
+        "updateDate": f"{date}T12:00:00",
+        "publishDate": f"{date}T12:00:00",
+        "organizationId": 17043304,
+        "organizationName": "United States of America Citizen Science",
+        "siteId": 200000 + number,
+        "siteName": f"{rng.randint(10, 99)}PQ{rng.randint(1000, 9999)}",
+        "countryName": None,
+        "countryCode": None,
+        "latitude": round(latitude, 2),
+        "longitude": round(longitude, 2),
+        "elevation": round(rng.uniform(0, 1500), 1),
+        "pid": 100000 + number,
+        "data": {
+            "mosquitohabitatmapperMeasuredAt": f"{date}T1{rng.randint(0, 9)}:15:00",
+            "mosquitohabitatmapperMeasurementLatitude": latitude,
+            "mosquitohabitatmapperMeasurementLongitude": longitude,
+            "mosquitohabitatmapperMeasurementElevation": round(rng.uniform(0, 1500), 1),
+            "mosquitohabitatmapperLocationMethod": "automatic",
+            "mosquitohabitatmapperLocationAccuracyM": rng.choice([5, 10, 30]),
+            "mosquitohabitatmapperWaterSource": water_source,
+            "mosquitohabitatmapperWaterSourceType": water_source_type,
+            "mosquitohabitatmapperLarvaeCount": rng.choice(larvae_counts),
+            "mosquitohabitatmapperGenus": rng.choice(genera),
+            "mosquitohabitatmapperSpecies": None,
+            "mosquitohabitatmapperLastIdentifyStage": rng.choice(["identify", "count"]),
+            "mosquitohabitatmapperBreedingGroundEliminated": rng.choice(
+                ["true", "false"]
+            ),
+            "mosquitohabitatmapperMosquitoEggs": rng.choice(["true", "false"]),
+            "mosquitohabitatmapperMosquitoEggCount": None,
+            "mosquitohabitatmapperMosquitoPupae": rng.choice(["true", "false"]),
+            "mosquitohabitatmapperMosquitoAdults": rng.choice(["true", "false"]),
+            "mosquitohabitatmapperWaterSourcePhotoUrls": photo("w"),
+            "mosquitohabitatmapperLarvaFullBodyPhotoUrls": photo("l"),
+            "mosquitohabitatmapperAbdomenCloseupPhotoUrls": photo("a"),
+            "mosquitohabitatmapperComments": None,
+            "mosquitohabitatmapperDataSource": "GLOBE Observer App",
+            "mosquitohabitatmapperUserid": 50000000 + rng.randint(0, 20),
+            "mosquitohabitatmapperMosquitoHabitatMapperId": 30000 + number,
+        },
+    }
+
+
+def make_recordings(directory=recordings_dir, seed=7):
+    rng = random.Random(seed)
+    recordings = Recordings(directory)
+    number = 0
+    for start, end in partition_date_range("2017-05-31", "2021-12-25"):
+        results = []
+        # Some months have no observations
+        for _ in range(rng.choice([0, 0, 1, 1, 2])):
+            number += 1
+            date = f"{start[:8]}{rng.randint(1, 28):02d}"
+            results.append(observation(rng, date, number))
+        results.sort(key=lambda result: result["measuredDate"])
+        params = {
+            "protocols": "mosquito_habitat_mapper",
+            "startdate": start,
+            "enddate": end,
+            "geojson": "FALSE",
+            "sample": "FALSE",
+        }
+        body = json.dumps({"results": results}, separators=(",", ":"))
+        recordings.put(recording_key(params), body.encode("utf-8"))
+
+
+if __name__ == "__main__":
+    make_recordings()
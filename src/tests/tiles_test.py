@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiles import project, remove_old_tiles, render_tiles  # noqa: E402
+
+test_df = pd.DataFrame.from_dict(
+    {
+        "lc_Latitude": [38.5, 38.5, -14.5, np.nan, -9999.0],
+        "lc_Longitude": [-77.0, -77.0, 120.25, 10.0, 10.0],
+    }
+)
+
+
+def test_project():
+    x, y = project(np.array([0.0, 85.1, -85.1]), np.array([0.0, -180.0, 180.0]), 1)
+    assert x.tolist() == [256, 0, 511]
+    assert y.tolist() == [256, 0, 511]
+
+
+def read_tile(path, z, x, y):
+    with Image.open(os.path.join(path, str(z), str(x), f"{y}.png")) as image:
+        return np.asarray(image.convert("RGBA"))
+
+
+def test_render_tiles(tmp_path):
+    path = render_tiles(test_df, "lc_Latitude", "lc_Longitude", "v1", str(tmp_path), 2)
+    assert path == os.path.join(str(tmp_path), "v1")
+    # Only tiles containing located observations are written
+    assert sorted(os.listdir(os.path.join(path, "0", "0"))) == ["0.png"]
+    assert sorted(os.listdir(os.path.join(path, "1"))) == ["0", "1"]
+
+    world = read_tile(path, 0, 0, 0)
+    opaque = world[..., 3] > 0
+    # Every observation covers 3x3 pixels, duplicates are drawn more opaque
+    assert opaque.sum() == 18
+    x, y = project(np.array([38.5, -14.5]), np.array([-77.0, 120.25]), 0)
+    assert world[y[0], x[0], 3] > world[y[1], x[1], 3]
+
+
+def test_render_tiles_is_cached(tmp_path):
+    path = render_tiles(test_df, "lc_Latitude", "lc_Longitude", "v1", str(tmp_path), 1)
+    modified = os.path.getmtime(os.path.join(path, "0", "0", "0.png"))
+    time.sleep(0.01)
+    assert (
+        render_tiles(test_df, "lc_Latitude", "lc_Longitude", "v1", str(tmp_path), 1)
+        == path
+    )
+    assert os.path.getmtime(os.path.join(path, "0", "0", "0.png")) == modified
+    assert os.listdir(str(tmp_path)) == ["v1"]
+
+
+def test_remove_old_tiles(tmp_path):
+    render_tiles(test_df, "lc_Latitude", "lc_Longitude", "v1", str(tmp_path), 0)
+    render_tiles(test_df, "lc_Latitude", "lc_Longitude", "v2", str(tmp_path), 0)
+    old = time.time() - 120
+    os.utime(os.path.join(str(tmp_path), "v1"), (old, old))
+    remove_old_tiles(str(tmp_path), max_age=60)
+    assert os.listdir(str(tmp_path)) == ["v2"]
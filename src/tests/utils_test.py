@@ -1,19 +1,38 @@
 import datetime
+import json
 import os
 import sys
+from functools import partial
 
 import numpy as np
 import pandas as pd
 import pytest
+from go_utils.filtering import filter_by_globe_team
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import utils  # noqa: E402
+from cache import MemoryCache  # noqa: E402
+from export import export_to_file  # noqa: E402
 from utils import (  # noqa: E402
     apply_cleanup_filters,
+    apply_filters,
+    cleanup_mask_functions,
+    cleanup_positions,
+    compile_numeric_predicate,
+    convert_df,
     datetime_to_str,
+    filter_positions,
+    generate_json_object,
     get_numeric_filter_args,
+    get_spatial_filter_args,
     get_value_filter_args,
+    is_list_column,
     numeric_filter,
+    optimize_column,
+    optimize_dtypes,
+    spatial_filter,
+    update_data_args,
     value_filter,
 )
 
@@ -75,6 +94,32 @@ value_test_values = [
     ),
 ]
 
+team_test_data = [
+    ["SEES2020", "ABC"],
+    ["SEES2021", "X"],
+    np.nan,
+    [],
+    ["SEES2020", "SEES2021"],
+    "SEES2022",
+]
+
+team_test_values = [
+    (["SEES2021"], False),
+    (["SEES2021"], True),
+    (["SEES2022", "ABC"], False),
+    (["SEES2022", "ABC"], True),
+    ([], False),
+    ([], True),
+]
+
+list_column_test_values = [
+    (["001001", "001111", None], False),
+    ([1.5, 2.0, np.nan], False),
+    (["SEES2020", 1], False),
+    ([["SEES2020", "ABC"], np.nan], True),
+    ([np.nan, "ABC", ["SEES2020"]], True),
+]
+
 numerical_test_string_values = [
     ("mhm_LarvaeCount > 5", ">", "5", "mhm_LarvaeCount"),
     ("mhm_LarvaeCount <= -8", "<=", "-8", "mhm_LarvaeCount"),
@@ -261,6 +306,109 @@ def test_cleanup_filters(
     assert desired_df.equals(out_df)
 
 
+def cleanup_mask_args(data, stage):
+    prefix = data.columns[0].split("_")[0]
+    lat, lon = f"{prefix}_Latitude", f"{prefix}_Longitude"
+    if stage == 0:
+        return [lat], 2
+    if stage == 1:
+        return lat, lon
+    return lat, lon, f"{prefix}_MGRSLatitude", f"{prefix}_MGRSLongitude"
+
+
+random_cleanup_data = pd.DataFrame.from_dict(
+    {
+        "mhm_Latitude": np.random.default_rng(0).choice([1.5, 2.0, -91.0, 45.25], 200),
+        "mhm_Longitude": np.random.default_rng(1).choice([1.5, 181.0, -3.75], 200),
+        "mhm_MGRSLatitude": np.random.default_rng(2).choice([1.5, 45.25, 3.5], 200),
+        "mhm_MGRSLongitude": np.random.default_rng(3).choice([1.5, -3.75, 7.0], 200),
+    }
+)
+
+
+@pytest.mark.parametrize("stage", [0, 1, 2])
+@pytest.mark.parametrize(
+    "data",
+    [params[0] for params in cleanup_filter_test_params if params[0].shape[1] == 4]
+    + [random_cleanup_data],
+)
+def test_native_cleanup_matches_go_utils(data, stage):
+    args = cleanup_mask_args(data, stage)
+    go_utils_mask = cleanup_mask_functions[False][stage](data, *args)
+    native_mask = cleanup_mask_functions[True][stage](data, *args)
+    assert list(native_mask) == list(go_utils_mask)
+
+
+@pytest.mark.parametrize("native", [True, False])
+def test_native_duplicates_on_multiple_columns(native):
+    data = pd.DataFrame.from_dict(
+        {
+            "lc_MGRSLatitude": [38.6, 38.6, 38.6, 31.42, np.nan, np.nan],
+            "lc_WaterSource": ["a", "a", "b", "a", "a", "a"],
+        }
+    )
+    mask = cleanup_mask_functions[native][0](
+        data, ["lc_MGRSLatitude", "lc_WaterSource"], 2
+    )
+    assert list(mask) == [False, False, True, True, True, True]
+
+
+def test_cleanup_stage_cache():
+    data, *_ = cleanup_filter_test_params[-1]
+    cache = MemoryCache(16)
+    args = [True, True, True, ["lc_Latitude"]]
+    first = apply_cleanup_filters(data, *args, 2, version="v1", cache=cache)
+    assert cache.stats == {"hits": 0, "misses": 4, "evictions": 0}
+    # The rows are taken from the cached positions
+    assert apply_cleanup_filters(data, *args, 2, version="v1", cache=cache).equals(
+        first
+    )
+    assert cache.stats == {"hits": 1, "misses": 4, "evictions": 0}
+
+    # Changing the group size only recomputes the duplicate stage
+    apply_cleanup_filters(data, *args, 3, version="v1", cache=cache)
+    assert cache.stats["misses"] == 6
+    assert cache.stats["hits"] == 3
+
+    # The cached result matches an uncached run
+    assert apply_cleanup_filters(data, *args, 2).equals(first)
+
+
+@pytest.mark.parametrize("params", cleanup_filter_test_params)
+def test_cleanup_positions(params):
+    data, *args, desired = params
+    positions = cleanup_positions(data, *args)
+    assert positions.dtype == np.int32
+    assert data.take(positions).equals(apply_cleanup_filters(data, *args))
+
+    cache = MemoryCache(16)
+    cached = cleanup_positions(data, *args, version="v1", cache=cache)
+    assert cleanup_positions(data, *args, version="v1", cache=cache) is cached
+    assert list(cached) == list(positions)
+
+
+def test_filter_positions():
+    df = pd.DataFrame.from_dict(
+        {"mhm_LarvaeCount": [5, 0, -9999, 10], "mhm_HasEggs": [True, False, True, True]}
+    )
+    filter_dict = {
+        "count": lambda data: numeric_filter(">", 0, "mhm_LarvaeCount", data),
+        "eggs": lambda data: value_filter([True], False, "mhm_HasEggs", data),
+    }
+    positions = filter_positions(df, filter_dict, ["count"])
+    assert positions.dtype == np.int32
+    assert list(positions) == [0, 3]
+    eggs = filter_positions(df, filter_dict, ["eggs"], np.array([3, 1, 2]))
+    assert list(eggs) == [3, 2]
+    assert list(filter_positions(df, filter_dict, [], np.array([1, 2]))) == [1, 2]
+
+    # Masks cover every row, so they are reused for other positions
+    cache = MemoryCache(8)
+    filter_positions(df, filter_dict, ["count"], np.array([0, 1]), "v1", cache)
+    filter_positions(df, filter_dict, ["count"], np.array([2, 3]), "v1", cache)
+    assert cache.stats["misses"] == 1
+
+
 def list_to_df(column, data):
     return pd.DataFrame.from_dict({column: data})
 
@@ -287,6 +435,19 @@ def test_value_filter(values, exclude, column, data, desired):
     )
 
 
+@pytest.mark.parametrize("values, exclude", team_test_values)
+def test_team_filter_matches_go_utils(values, exclude):
+    df = list_to_df("mhm_GLOBETeams", team_test_data)
+    desired = filter_by_globe_team(df, "mhm_GLOBETeams", values, exclude)
+    mask = value_filter(values, exclude, "mhm_GLOBETeams", df)
+    assert list(df.index[mask]) == list(desired.index)
+
+
+@pytest.mark.parametrize("data, is_list", list_column_test_values)
+def test_is_list_column(data, is_list):
+    assert is_list_column(pd.Series(data, dtype=object)) == is_list
+
+
 @pytest.mark.parametrize(
     "filter_name, operation, value, column", numerical_test_string_values
 )
@@ -297,6 +458,60 @@ def test_numeric_filter_parse(filter_name, operation, value, column):
     assert test_column == column
 
 
+def test_apply_filters_mask_cache():
+    df = pd.DataFrame.from_dict(
+        {"mhm_LarvaeCount": [5, 0, -9999, 10], "mhm_HasEggs": [True, False, True, True]}
+    )
+    calls = []
+
+    def counted(name, func):
+        def filter_func(data):
+            calls.append(name)
+            return func(data)
+
+        return filter_func
+
+    filter_dict = {
+        "mhm_LarvaeCount > 0": counted(
+            "count", lambda data: numeric_filter(">", 0, "mhm_LarvaeCount", data)
+        ),
+        "mhm_HasEggs in [True]": counted(
+            "eggs", lambda data: value_filter([True], False, "mhm_HasEggs", data)
+        ),
+    }
+    cache = MemoryCache(8)
+    selected = list(filter_dict)
+    expected = df[[True, False, False, True]]
+    assert apply_filters(df, filter_dict, selected, "v1", cache).equals(expected)
+    assert apply_filters(df, filter_dict, selected[::-1], "v1", cache).equals(expected)
+    assert apply_filters(df, filter_dict, selected[:1], "v1", cache).equals(
+        df[[True, False, False, True]]
+    )
+    assert calls == ["count", "eggs"]
+
+    # A new dataset version invalidates the cached masks
+    apply_filters(df, filter_dict, selected, "v2", cache)
+    assert calls == ["count", "eggs", "count", "eggs"]
+    assert len(cache) == 2
+    assert apply_filters(df, filter_dict, [], "v2", cache).equals(df)
+
+
+def test_compiled_numeric_predicate():
+    df = list_to_df("mhm_LarvaeCount", [5, 0, -9999, 10])
+    predicate = compile_numeric_predicate(">", "5", "mhm_LarvaeCount")
+    assert predicate is compile_numeric_predicate(">", "5", "mhm_LarvaeCount")
+    assert list(predicate(df)) == [False, False, False, True]
+
+
+@pytest.mark.parametrize(
+    "operation, value",
+    [("=", 5), ("> 0 or __import__('os').system('ls') or df['x'] >", 5)],
+)
+def test_numeric_filter_rejects_invalid_operations(operation, value):
+    with pytest.raises(ValueError):
+        compile_numeric_predicate(operation, value, "mhm_LarvaeCount")
+
+
 @pytest.mark.parametrize(
     "filter_name, values, exclude, column", value_test_string_values
 )
@@ -311,3 +526,132 @@ def test_value_filter_parse(filter_name, values, exclude, column):
 def test_datetime_conversion(datetime, datetime_str):
     test_str = datetime_to_str(datetime)
     assert test_str == datetime_str
+
+
+def test_optimize_dtypes():
+    df = pd.DataFrame.from_dict(
+        {
+            "mhm_WaterSource": ["pond", "lake", "pond", None, "pond", "lake"],
+            "mhm_siteName": ["a", "b", "c", "d", "e", "f"],
+            "mhm_LarvaeCount": [5.0, np.nan, 1.0, 10.0, 0.0, 3.0],
+            "mhm_Latitude": [37.5, 0.1, 75.5, -90.0, 14.25, 3.0],
+            "mhm_PhotoCount": [0, 1, 2, 3, 4, 5],
+            "mhm_HasEggs": [True, False, False, True, True, False],
+            "mhm_GLOBETeams": [["A"], ["B"], [], ["A", "B"], ["C"], ["A"]],
+        }
+    )
+    optimized = optimize_dtypes(df, category_max_ratio=0.5)
+    assert optimized["mhm_WaterSource"].dtype == "category"
+    assert optimized["mhm_siteName"].dtype == object
+    assert optimized["mhm_LarvaeCount"].dtype == np.float32
+    assert optimized["mhm_Latitude"].dtype == np.float64
+    assert optimized["mhm_PhotoCount"].dtype == np.int32
+    assert df["mhm_PhotoCount"].dtype == np.int64
+    report = optimized.attrs["memory_report"]
+    assert report["after_bytes"] < report["before_bytes"]
+
+    # Exports and filters are unaffected by the new dtypes
+    assert optimized.to_csv() == df.to_csv()
+    filters = [
+        partial(numeric_filter, ">=", 3.0000001, "mhm_LarvaeCount"),
+        partial(numeric_filter, "<", 2, "mhm_PhotoCount"),
+        partial(value_filter, ["pond"], False, "mhm_WaterSource"),
+        partial(value_filter, ["pond"], True, "mhm_WaterSource"),
+        partial(value_filter, ["A"], True, "mhm_GLOBETeams"),
+    ]
+    for filter_func in filters:
+        assert list(filter_func(df)) == list(filter_func(optimized))
+
+
+def test_optimize_column_limits():
+    # The default ratio leaves moderately repetitive strings alone
+    sources = pd.Series(["pond", "lake", "pond", "river"] * 5, dtype=object)
+    assert optimize_column(sources).dtype == object
+    assert optimize_column(sources, category_max_ratio=0.5).dtype == "category"
+
+    # Categoricals that would use more memory are not kept
+    tiny = pd.Series(["a"], dtype=object)
+    assert optimize_column(tiny, category_max_ratio=1.0) is tiny
+
+    # Integers are never narrowed below int32
+    assert optimize_column(pd.Series([0, 1, 2])).dtype == np.int32
+    large = pd.Series([0, 2**40])
+    assert optimize_column(large) is large
+
+
+def test_convert_df_export_cache(tmp_path, monkeypatch):
+    exports = []
+
+    def counted_export(df, export_format):
+        exports.append(export_format)
+        return export_to_file(df, export_format, str(tmp_path))
+
+    monkeypatch.setattr(utils, "export_to_file", counted_export)
+    df = list_to_df("mhm_LarvaeCount", [5, 0, -9999, 10])
+    cache = MemoryCache(8)
+    path = convert_df(df, "csv", "v1", cache)
+    assert convert_df(df, "csv", "v1", cache) == path
+    assert exports == ["csv"]
+
+    convert_df(df, "parquet", "v1", cache)
+    convert_df(df, "csv", "v2", cache)
+    assert exports == ["csv", "parquet", "csv"]
+
+    # Exports removed from disk are written again
+    os.remove(path)
+    new_path = convert_df(df, "csv", "v1", cache)
+    assert os.path.exists(new_path)
+    assert exports == ["csv", "parquet", "csv", "csv"]
+
+
+spatial_test_values = [
+    ("bbox", [0.0, -10.0, 40.0, 10.0], [True, False, False, False]),
+    ("bbox", [-90.0, 170.0, 90.0, -170.0], [False, False, True, False]),
+    ("polygon", [[-1, -1], [50, -1], [50, 150], [-1, 150]], [True, True, False, False]),
+]
+
+
+@pytest.mark.parametrize("shape, coords, desired", spatial_test_values)
+def test_spatial_filter(shape, coords, desired):
+    df = pd.DataFrame(
+        {
+            "mhm_Latitude": [38.5, 14.5, 10.0, np.nan],
+            "mhm_Longitude": [0.5, 120.25, 179.5, 0.0],
+        }
+    )
+    name = f"mhm_Latitude, mhm_Longitude within {shape} {coords}"
+    args = get_spatial_filter_args(name)
+    assert args == (shape, coords, "mhm_Latitude", "mhm_Longitude")
+    assert spatial_filter(*args, df).tolist() == desired
+
+
+def test_spatial_filter_metadata_roundtrip():
+    spatial_name = "mhm_Latitude, mhm_Longitude within bbox [0.0, -10.0, 40.0, 10.0]"
+    metadata = json.loads(
+        generate_json_object(
+            {
+                "protocol": "Mosquito Habitat Mapper",
+                "start_date": datetime.date(2017, 5, 31),
+                "end_date": datetime.date(2021, 12, 25),
+                "countries": [],
+                "regions": [],
+                "selected_filters": [spatial_name, "mhm_WaterSource in ['pond']"],
+                "cleanup_filters": {},
+            }
+        )
+    )
+    assert metadata["selected_filter_types"] == ["spatial", "value"]
+
+    download_args, selected_filters, cleanup_filters, filters = {}, [], {}, {}
+    update_data_args(
+        metadata, download_args, selected_filters, cleanup_filters, filters
+    )
+    df = pd.DataFrame(
+        {
+            "mhm_Latitude": [38.5, 14.5, 38.5],
+            "mhm_Longitude": [0.5, 120.25, 0.5],
+            "mhm_WaterSource": ["pond", "pond", "lake"],
+        }
+    )
+    assert filters[spatial_name](df).tolist() == [True, False, True]
+    assert apply_filters(df, filters, selected_filters).index.tolist() == [0]
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from views import RowView, materialize  # noqa: E402
+
+test_df = pd.DataFrame.from_dict(
+    {
+        "mhm_Latitude": [38.5, 14.5, 87.5, 31.41],
+        "mhm_WaterSource": ["pond", "lake", "pond", "container"],
+    }
+)
+
+
+def test_row_view():
+    view = RowView(test_df, [3, 1])
+    assert len(view) == 2
+    assert view.positions.dtype == np.int32
+    assert list(view.columns) == list(test_df.columns)
+    assert view["mhm_WaterSource"].tolist() == ["container", "lake"]
+    assert view.take([1]).equals(test_df.iloc[[1]])
+    assert materialize(view).equals(test_df.iloc[[3, 1]])
+    assert materialize(test_df) is test_df
@@ -0,0 +1,171 @@
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from constants import (
+    tile_color,
+    tile_dir,
+    tile_max_age,
+    tile_max_zoom,
+    tile_saturation,
+    tile_size,
+)
+
+# Latitude bounds of the web mercator projection
+max_latitude = 85.0511287798
+
+
+def project(latitudes, longitudes, zoom, size=tile_size):
+    """Projects coordinates to web mercator pixel coordinates.
+    Parameters
+    ----------
+    latitudes: np.ndarray
+        Latitudes in degrees
+    longitudes: np.ndarray
+        Longitudes in degrees
+    zoom: int
+        Zoom level
+    size: int, default=tile_size
+        Width and height of a tile in pixels
+    Returns
+    -------
+    tuple of np.ndarray
+        Global x and y pixel of every coordinate at the zoom level
+    """
+    scale = size * 2**zoom
+    sin = np.sin(np.radians(np.clip(latitudes, -max_latitude, max_latitude)))
+    x = (longitudes + 180) / 360 * scale
+    y = (0.5 - np.log((1 + sin) / (1 - sin)) / (4 * np.pi)) * scale
+    return (
+        np.clip(x, 0, scale - 1).astype(np.int64),
+        np.clip(y, 0, scale - 1).astype(np.int64),
+    )
+
+
+def spread_counts(counts, saturation=tile_saturation):
+    """Clips observation counts to the saturation count and grows every observation to 3x3 pixels so single points stay visible."""
+    levels = np.minimum(counts, saturation).astype(np.uint8)
+    spread = levels.copy()
+    np.maximum(spread[1:], levels[:-1], out=spread[1:])
+    np.maximum(spread[:-1], levels[1:], out=spread[:-1])
+    rows = spread.copy()
+    np.maximum(spread[:, 1:], rows[:, :-1], out=spread[:, 1:])
+    np.maximum(spread[:, :-1], rows[:, 1:], out=spread[:, :-1])
+    return spread
+
+
+def tile_palette(saturation=tile_saturation, color=tile_color):
+    """Generates the palette and opacities of the tiles.
+    Parameters
+    ----------
+    saturation: int, default=tile_saturation
+        Count at which a pixel becomes fully opaque
+    color: tuple of int, default=tile_color
+        RGB color of the observations
+    Returns
+    -------
+    tuple of (list of int, bytes)
+        Flattened RGB palette and the opacity of every palette entry, indexed by the (clipped) count. The opacity grows logarithmically with the count and is the same for every tile, so neighbouring tiles line up.
+    """
+    counts = np.arange(saturation + 1)
+    alpha = np.where(
+        counts > 0, 0.35 + 0.65 * np.log1p(counts) / np.log1p(saturation), 0
+    )
+    return (
+        list(color) * (saturation + 1),
+        np.round(alpha * 255).astype(np.uint8).tobytes(),
+    )
+
+
+def save_tile(path, counts, palette=None):
+    """Writes a grid of observation counts as a palette PNG."""
+    palette, transparency = palette or tile_palette()
+    image = Image.fromarray(spread_counts(counts), mode="P")
+    image.putpalette(palette)
+    # Tiles are written once and mostly empty, fast compression is good enough
+    image.save(path, format="png", transparency=transparency, compress_level=1)
+
+
+def render_zoom(latitudes, longitudes, zoom, directory, size=tile_size):
+    """Writes the z/x/y.png tiles of one zoom level, skipping tiles without observations."""
+    x, y = project(latitudes, longitudes, zoom, size)
+    tiles = (x // size << 32) | (y // size)
+    pixels = (y % size) * size + x % size
+    order = np.argsort(tiles, kind="stable")
+    tiles, pixels = tiles[order], pixels[order]
+    unique_tiles, starts = np.unique(tiles, return_index=True)
+    palette = tile_palette()
+    for tile, start, end in zip(unique_tiles, starts, [*starts[1:], len(tiles)]):
+        counts = np.bincount(pixels[start:end], minlength=size * size)
+        tile_x, tile_y = tile >> 32, tile & 0xFFFFFFFF
+        tile_path = os.path.join(directory, str(zoom), str(tile_x))
+        os.makedirs(tile_path, exist_ok=True)
+        save_tile(
+            os.path.join(tile_path, f"{tile_y}.png"),
+            counts.reshape(size, size),
+            palette,
+        )
+    return len(unique_tiles)
+
+
+def remove_old_tiles(directory=tile_dir, max_age=tile_max_age):
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if time.time() - os.path.getmtime(path) > max_age:
+                shutil.rmtree(path)
+        except OSError:
+            continue
+
+
+def render_tiles(
+    df, lat_col, lon_col, version, directory=tile_dir, max_zoom=tile_max_zoom
+):
+    """Rasterizes observations into z/x/y PNG tiles cached on disk.
+    Parameters
+    ----------
+    df: pd.DataFrame
+        Data to display
+    lat_col: str
+        Name of the latitude column
+    lon_col: str
+        Name of the longitude column
+    version: str
+        Version token of df (see cache.dataset_version), the tiles are stored under it
+    directory: str, default=tile_dir
+        Directory holding the tiles of every version
+    max_zoom: int, default=tile_max_zoom
+        Deepest zoom level rendered
+    Returns
+    -------
+    str
+        Path of the tiles of this version, laid out as {z}/{x}/{y}.png. Tiles of a version are only rendered once.
+    """
+    path = os.path.join(directory, version)
+    if os.path.isdir(path):
+        return path
+    remove_old_tiles(directory)
+
+    latitudes = pd.to_numeric(df[lat_col], errors="coerce").to_numpy(dtype=np.float64)
+    longitudes = pd.to_numeric(df[lon_col], errors="coerce").to_numpy(dtype=np.float64)
+    located = (np.abs(latitudes) <= 90) & (np.abs(longitudes) <= 180)
+    latitudes, longitudes = latitudes[located], longitudes[located]
+
+    # Render into a temporary directory first so the map never loads a partial set
+    os.makedirs(directory, exist_ok=True)
+    temp_path = tempfile.mkdtemp(dir=directory, prefix=".")
+    for zoom in range(max_zoom + 1):
+        render_zoom(latitudes, longitudes, zoom, temp_path)
+    try:
+        os.rename(temp_path, path)
+    except OSError:
+        # Another session rendered the same version in the meantime
+        shutil.rmtree(temp_path, ignore_errors=True)
+    return path
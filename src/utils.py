@@ -1,22 +1,94 @@
 import ast
 import datetime
 import json
+import logging
+import operator
+import os
 import re
-from functools import partial
+from functools import lru_cache, partial
 
 import numpy as np
-import streamlit as st
-from go_utils import get_api_data
+import pandas as pd
 from go_utils.filtering import (
-    filter_by_globe_team,
     filter_duplicates,
     filter_invalid_coords,
     filter_poor_geolocational_data,
 )
 from go_utils.geoenrich import get_country_api_data
-from pandas.api.types import is_hashable
+from pandas.api.types import (
+    infer_dtype,
+    is_bool_dtype,
+    is_float_dtype,
+    is_hashable,
+    is_integer_dtype,
+)
+
+from cache import dataset_cache, dataset_key
+from constants import (
+    category_max_ratio,
+    data_keys,
+    date_fmt,
+    default_cleanup_dict,
+    download_workers,
+    native_cleanup,
+    protocols,
+)
+from export import export_to_file
+from fetching import (
+    DownloadCancelled,
+    fetch_partitioned_data,
+    fetch_whole_range,
+    is_recent_range,
+)
+from indexing import get_grid_index, get_inverted_index
+from profiling import profiled, span
+
+
+numeric_operators = {
+    ">": operator.gt,
+    "<": operator.lt,
+    "==": operator.eq,
+    ">=": operator.ge,
+    "<=": operator.le,
+    "!=": operator.ne,
+}
+
+numeric_filter_pattern = re.compile(
+    r"(?P<column>.+) (?P<operation>{}) (?P<value>\S+)".format(
+        "|".join(sorted(map(re.escape, numeric_operators), key=len, reverse=True))
+    )
+)
+
+
+@lru_cache(maxsize=1024)
+def compile_numeric_predicate(operation, value, column):
+    """Compiles a numeric filter into a vectorized predicate.
+    Parameters
+    ----------
+    operation: str
+        Operator used to filter data (e.g. ">", "<", "==", ">=", "<=", "!=")
+    value: float
+        Operand / number
+    column: str
+        String for column name
+    Returns
+    -------
+    callable
+        Function mapping a DataFrame to a 1D Boolean array. Identical filters share the same compiled predicate.
+    """
+    if operation not in numeric_operators:
+        raise ValueError(f"Unsupported numeric filter operation: {operation}")
+    compare = numeric_operators[operation]
+    operand = float(value)
 
-from constants import data_keys, date_fmt, default_cleanup_dict, protocols
+    def predicate(df):
+        values = df[column].to_numpy()
+        # Columns downcast at ingestion are compared at full precision
+        if values.dtype == np.float32:
+            values = values.astype(np.float64)
+        return compare(values, operand)
+
+    return predicate
 
 
 def numeric_filter(operation, value, column, df):
@@ -36,13 +108,34 @@ def numeric_filter(operation, value, column, df):
     ndarray
         1D Boolean array that indicates whether each entry of the DataFrame matches the given numeric filter.
     """
-    return eval(f"df['{column}'] {operation} {value}")
+    return compile_numeric_predicate(operation, value, column)(df)
 
 
+@lru_cache(maxsize=1024)
 def get_numeric_filter_args(filter_name):
+    match = numeric_filter_pattern.fullmatch(filter_name)
+    if match is None:
+        raise ValueError(f"Invalid numeric filter: {filter_name}")
+    return match.group("operation"), match.group("value"), match.group("column")
 
-    column, operation, value = filter_name.split(" ")
-    return operation, value, column
+
+def is_list_column(series):
+    """Checks whether a data column holds unhashable entries such as lists of GLOBE teams.
+    Parameters
+    ----------
+    series: pd.Series
+        Data column
+    Returns
+    -------
+    bool
+        True if at least one entry of the column is unhashable.
+    """
+    if series.dtype != object:
+        return False
+    # infer_dtype runs in C and only reports "mixed" types for columns that could hold lists
+    if not infer_dtype(series, skipna=True).startswith("mixed"):
+        return False
+    return not all(map(is_hashable, series.to_numpy()))
 
 
 def value_filter(values, exclude, column, df):
@@ -62,17 +155,11 @@ def value_filter(values, exclude, column, df):
     ndarray
         1D Boolean array mask indicating which entries match the given criteria
     """
-    if np.all([np.vectorize(is_hashable)(df[column].to_numpy())]):
-        if exclude:
-            data_filter = np.vectorize(lambda entry: entry not in values)
-        else:
-            data_filter = np.vectorize(lambda entry: entry in values)
-        return data_filter(df[column].to_numpy())
-    else:
-        filtered_teams = filter_by_globe_team(df, column, values, exclude)
-        mask = df.isin(filtered_teams)
-        mask = np.any(mask, axis=1)
-        return mask
+    series = df[column]
+    if is_list_column(series):
+        return get_inverted_index(df, column).mask(values, exclude)
+    mask = series.isin(values).to_numpy()
+    return ~mask if exclude else mask
 
 
 def get_value_filter_args(filter_name):
@@ -82,43 +169,414 @@ def get_value_filter_args(filter_name):
     return values, exclude, column
 
 
-@st.cache
-def convert_df(df):
-    # IMPORTANT: Cache the conversion to prevent computation on every rerun
-    return df.to_csv().encode("utf-8")
+spatial_filter_pattern = re.compile(
+    r"(?P<lat_col>\S+), (?P<lon_col>\S+) within (?P<shape>bbox|polygon) (?P<coords>\[.*\])"
+)
 
 
-def apply_filters(data, filter_dict, selected_filters_list):
-    # All filters return a boolean mask used to filter the finalized dataset
-    mask = np.full(len(data), True)
+def spatial_filter(shape, coords, lat_col, lon_col, df):
+    """Filters data by location.
+    Parameters
+    ----------
+    shape: str
+        "bbox" or "polygon"
+    coords: list
+        [min_lat, min_lon, max_lat, max_lon] for a bounding box, [[lat, lon], ...] vertices for a polygon
+    lat_col: str
+        Name of the latitude column
+    lon_col: str
+        Name of the longitude column
+    df: pd.DataFrame
+        DataFrame
+    Returns
+    -------
+    ndarray
+        1D Boolean array mask indicating which entries lie inside the shape
+    """
+    index = get_grid_index(df, lat_col, lon_col)
+    if shape == "bbox":
+        return index.bbox_mask(*coords)
+    if shape == "polygon":
+        return index.polygon_mask(coords)
+    raise ValueError(f"Unsupported spatial filter shape: {shape}")
+
+
+def get_spatial_filter_args(filter_name):
+    match = spatial_filter_pattern.fullmatch(filter_name)
+    if match is None:
+        raise ValueError(f"Invalid spatial filter: {filter_name}")
+    return (
+        match.group("shape"),
+        ast.literal_eval(match.group("coords")),
+        match.group("lat_col"),
+        match.group("lon_col"),
+    )
+
+
+def get_filter_type(filter_name):
+    if spatial_filter_pattern.fullmatch(filter_name):
+        return "spatial"
+    return "value" if "in" in filter_name else "numeric"
+
+
+def cached_export(export_format, version, cache):
+    """Returns the path of a previous export of a dataset version, or None if there is none."""
+    path = cache.get((version, export_format))
+    # Old exports are removed from disk, so a cached path can be stale
+    if path is not None and os.path.exists(path):
+        return path
+    return None
+
+
+@profiled("export")
+def convert_df(df, export_format="csv", version=None, cache=None):
+    """Exports a dataset to a file on disk.
+    Parameters
+    ----------
+    df: pd.DataFrame or views.RowView
+        Data to export, the rows of a view are copied one chunk at a time (see export.export_data)
+    export_format: str, default="csv"
+        One of "csv", "csv.gz", "parquet" or "feather"
+    version: hashable, default=None
+        Version token of df (see cache.dataset_version)
+    cache: MemoryCache, default=None
+        Cache of export paths. If a version is given, the export of the same version and format is reused.
+    Returns
+    -------
+    str
+        Path of the exported file
+    """
+    use_cache = cache is not None and version is not None
+    if use_cache:
+        path = cached_export(export_format, version, cache)
+        if path is not None:
+            return path
+    path = export_to_file(df, export_format)
+    if use_cache:
+        cache.put((version, export_format), path)
+    return path
+
+
+def _filter_mask(data, filter_dict, selected_filters_list, version, cache):
+    use_cache = cache is not None and version is not None
+    if use_cache:
+        cache.invalidate(lambda key: key[0] != version)
+
+    # Masks are stored as packed bitmaps, so combining them is a single AND over bytes
+    bitmaps = []
     for key, filter_func in filter_dict.items():
-        if key in selected_filters_list:
-            mask = (mask) & filter_func(data)
+        if key not in selected_filters_list:
+            continue
+        bitmap = cache.get((version, key)) if use_cache else None
+        if bitmap is None:
+            with span("filter", name=key):
+                bitmap = np.packbits(np.asarray(filter_func(data), dtype=bool))
+            if use_cache:
+                cache.put((version, key), bitmap)
+        bitmaps.append(bitmap)
+
+    if not bitmaps:
+        return None
+    return np.unpackbits(np.bitwise_and.reduce(bitmaps), count=len(data)).view(bool)
+
+
+@profiled("filters")
+def apply_filters(data, filter_dict, selected_filters_list, version=None, cache=None):
+    """Applies the selected filters to a dataset.
+    Parameters
+    ----------
+    data: pd.DataFrame
+        DataFrame to filter
+    filter_dict: dict of {str: callable}
+        Filter functions by filter name, each returning a 1D Boolean mask
+    selected_filters_list: list of str
+        Names of the filters to apply
+    version: hashable, default=None
+        Version token of data (see cache.dataset_version)
+    cache: MemoryCache, default=None
+        Cache of filter masks. Masks are only cached if a version is given and entries of other versions are discarded.
+    Returns
+    -------
+    pd.DataFrame
+        Rows of data matching every selected filter
+    """
+    mask = _filter_mask(data, filter_dict, selected_filters_list, version, cache)
+    if mask is None:
+        return data[np.full(len(data), True)]
     return data[mask]
 
 
-def apply_cleanup_filters(
+@profiled("filters")
+def filter_positions(
+    data, filter_dict, selected_filters_list, positions=None, version=None, cache=None
+):
+    """Applies the selected filters to rows of a dataset without copying them.
+    Parameters
+    ----------
+    data: pd.DataFrame
+        DataFrame to filter
+    filter_dict: dict of {str: callable}
+        Filter functions by filter name, each returning a 1D Boolean mask
+    selected_filters_list: list of str
+        Names of the filters to apply
+    positions: np.ndarray, default=None
+        Positions of the rows to filter (e.g. from cleanup_positions), every row if None
+    version: hashable, default=None
+        Version token of data (see cache.dataset_version)
+    cache: MemoryCache, default=None
+        Cache of filter masks. The masks cover every row of data, so they are reused when positions change.
+    Returns
+    -------
+    np.ndarray
+        int32 positions of the rows matching every selected filter, in the order of positions
+    """
+    if positions is None:
+        positions = np.arange(len(data), dtype=np.int32)
+    mask = _filter_mask(data, filter_dict, selected_filters_list, version, cache)
+    if mask is None:
+        return positions
+    return positions[mask[positions]]
+
+
+def _positional(data):
+    # The go_utils filters keep the index, a RangeIndex lets us map kept rows to positions
+    index = data.index
+    if isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1:
+        return data
+    return data.reset_index(drop=True)
+
+
+def _kept_rows(filtered, length):
+    mask = np.full(length, False)
+    mask[filtered.index.to_numpy()] = True
+    return mask
+
+
+def duplicate_mask(data, columns, group_size):
+    """Returns a 1D Boolean mask of the rows kept by go_utils' filter_duplicates."""
+    filtered = filter_duplicates(_positional(data), columns, group_size)
+    return _kept_rows(filtered, len(data))
+
+
+def invalid_coords_mask(data, lat, lon):
+    """Returns a 1D Boolean mask of the rows kept by go_utils' filter_invalid_coords."""
+    return _kept_rows(filter_invalid_coords(_positional(data), lat, lon), len(data))
+
+
+def poor_geolocation_mask(data, lat, lon, mgrs_lat, mgrs_lon):
+    """Returns a 1D Boolean mask of the rows kept by go_utils' filter_poor_geolocational_data.
+
+    Rows without coordinates are not kept (go_utils cannot evaluate them).
+    """
+    frame = _positional(data)
+    located = np.isfinite(frame[lat].to_numpy(dtype=float)) & np.isfinite(
+        frame[lon].to_numpy(dtype=float)
+    )
+    if not located.all():
+        frame = frame[located]
+    filtered = filter_poor_geolocational_data(frame, lat, lon, mgrs_lat, mgrs_lon)
+    return _kept_rows(filtered, len(data))
+
+
+def native_duplicate_mask(data, columns, group_size):
+    """Vectorized equivalent of duplicate_mask.
+
+    Rows are grouped by hashing their values in the given columns. Rows in groups of at
+    least group_size entries are removed, rows with missing values are never duplicates.
+    """
+    groups = data.groupby(
+        by=list(columns), sort=False, dropna=True, observed=True
+    ).ngroup()
+    # Rows with missing values are not assigned to a group
+    groups = groups.fillna(-1).to_numpy(dtype=np.int64)
+    grouped = groups >= 0
+    sizes = np.bincount(groups[grouped])
+    mask = np.full(len(data), True)
+    mask[grouped] = sizes[groups[grouped]] < group_size
+    return mask
+
+
+def native_invalid_coords_mask(data, lat, lon):
+    """Vectorized equivalent of invalid_coords_mask."""
+    latitudes = data[lat].to_numpy(dtype=float)
+    longitudes = data[lon].to_numpy(dtype=float)
+    return (
+        (latitudes > -90) & (latitudes < 90) & (longitudes < 180) & (longitudes > -180)
+    )
+
+
+def native_poor_geolocation_mask(data, lat, lon, mgrs_lat, mgrs_lon):
+    """Vectorized equivalent of poor_geolocation_mask."""
+    latitudes = data[lat].to_numpy(dtype=float)
+    longitudes = data[lon].to_numpy(dtype=float)
+    with np.errstate(invalid="ignore"):
+        poor = (
+            (
+                (data[mgrs_lat].to_numpy(dtype=float) == latitudes)
+                & (data[mgrs_lon].to_numpy(dtype=float) == longitudes)
+            )
+            | (latitudes == np.trunc(latitudes))
+            | (longitudes == np.trunc(longitudes))
+        )
+    return np.isfinite(latitudes) & np.isfinite(longitudes) & ~poor
+
+
+cleanup_mask_functions = {
+    False: (duplicate_mask, invalid_coords_mask, poor_geolocation_mask),
+    True: (
+        native_duplicate_mask,
+        native_invalid_coords_mask,
+        native_poor_geolocation_mask,
+    ),
+}
+
+
+def cleanup_stages(
     data,
     poor_geolocation_filter,
     valid_coords_filter,
     duplicate_filter,
     duplicate_filter_cols=[],
     duplicate_filter_size=0,
+    native=native_cleanup,
 ):
-    # If geolocational filter: apply geolocational filter, repeat for others.
+    """Lists the enabled cleanup stages.
+    Returns
+    -------
+    list of tuple
+        (key, mask function) of every enabled stage. The key holds the stage name and parameters, the mask function returns the 1D Boolean mask of the rows the stage keeps.
+    """
     lat = [col for col in data.columns if "_Latitude" in col][0]
     lon = [col for col in data.columns if "_Longitude" in col][0]
 
+    duplicates, invalid_coords, poor_geolocation = cleanup_mask_functions[native]
+    stages = []
     if duplicate_filter and len(duplicate_filter_cols) > 0:
-        data = filter_duplicates(data, duplicate_filter_cols, duplicate_filter_size)
+        columns = list(duplicate_filter_cols)
+        stages.append(
+            (
+                ("duplicates", native, tuple(columns), duplicate_filter_size),
+                partial(duplicates, data, columns, duplicate_filter_size),
+            )
+        )
     if valid_coords_filter:
-        data = filter_invalid_coords(data, lat, lon)
+        stages.append(
+            (
+                ("valid_coords", native, lat, lon),
+                partial(invalid_coords, data, lat, lon),
+            )
+        )
     if poor_geolocation_filter:
         mgrs_lat = [col for col in data.columns if "_MGRSLatitude" in col][0]
         mgrs_lon = [col for col in data.columns if "_MGRSLongitude" in col][0]
-        data = filter_poor_geolocational_data(data, lat, lon, mgrs_lat, mgrs_lon)
+        stages.append(
+            (
+                ("poor_geolocation", native, lat, lon, mgrs_lat, mgrs_lon),
+                partial(poor_geolocation, data, lat, lon, mgrs_lat, mgrs_lon),
+            )
+        )
+    return stages
 
-    return data
+
+def combine_stages(stages, length, version=None, cache=None):
+    """Combines the masks of the cleanup stages (see cleanup_stages) into one 1D Boolean mask.
+
+    Every stage is evaluated on the full data and duplicates are found before other
+    filters remove entries, so a stage mask does not depend on the other stages and is
+    cached on its own to be reused when only their parameters change.
+    """
+    mask = np.full(length, True)
+    for key, compute_mask in stages:
+        if cache is not None:
+            mask &= cache.get_or_compute((version, "stage", key), compute_mask)
+        else:
+            mask &= compute_mask()
+    return mask
+
+
+def apply_cleanup_filters(
+    data,
+    poor_geolocation_filter,
+    valid_coords_filter,
+    duplicate_filter,
+    duplicate_filter_cols=[],
+    duplicate_filter_size=0,
+    version=None,
+    cache=None,
+    native=native_cleanup,
+):
+    """Returns the rows of data kept by the cleanup filters (see cleanup_positions), data itself if none are removed."""
+    positions = cleanup_positions(
+        data,
+        poor_geolocation_filter,
+        valid_coords_filter,
+        duplicate_filter,
+        duplicate_filter_cols,
+        duplicate_filter_size,
+        version,
+        cache,
+        native,
+    )
+    return data if len(positions) == len(data) else data.iloc[positions]
+
+
+@profiled("cleanup filters")
+def cleanup_positions(
+    data,
+    poor_geolocation_filter,
+    valid_coords_filter,
+    duplicate_filter,
+    duplicate_filter_cols=[],
+    duplicate_filter_size=0,
+    version=None,
+    cache=None,
+    native=native_cleanup,
+):
+    """Applies the selected cleanup filters to a dataset without copying it.
+    Parameters
+    ----------
+    data: pd.DataFrame
+        DataFrame to clean
+    poor_geolocation_filter: bool
+        Whether to remove entries with poor geolocational data
+    valid_coords_filter: bool
+        Whether to remove entries with invalid coordinates
+    duplicate_filter: bool
+        Whether to remove suspected duplicate entries
+    duplicate_filter_cols: list of str
+        Columns shared by duplicate entries
+    duplicate_filter_size: int
+        Minimum number of entries in a group of duplicates
+    version: hashable, default=None
+        Version token of data (see cache.dataset_version)
+    cache: MemoryCache, default=None
+        Cache of stage masks and positions. Only used if a version is given and entries of other versions are discarded.
+    native: bool, default=native_cleanup
+        Whether to use the vectorized cleanup filters instead of the go_utils ones
+    Returns
+    -------
+    np.ndarray
+        int32 positions of the rows kept by the cleanup filters (see views.RowView)
+    """
+    stages = cleanup_stages(
+        data,
+        poor_geolocation_filter,
+        valid_coords_filter,
+        duplicate_filter,
+        duplicate_filter_cols,
+        duplicate_filter_size,
+        native,
+    )
+
+    def compute_positions(cache=None):
+        mask = combine_stages(stages, len(data), version, cache)
+        return np.flatnonzero(mask).astype(np.int32)
+
+    if cache is None or version is None:
+        return compute_positions()
+    cache.invalidate(lambda key: key[0] != version)
+    positions_key = (version, "positions", tuple(key for key, _ in stages))
+    return cache.get_or_compute(positions_key, lambda: compute_positions(cache))
 
 
 def update_data_args(
@@ -131,6 +589,7 @@ def update_data_args(
     filter_types = {
         "numeric": (get_numeric_filter_args, numeric_filter),
         "value": (get_value_filter_args, value_filter),
+        "spatial": (get_spatial_filter_args, spatial_filter),
     }
 
     download_args["protocol"] = protocols[metadata["protocol"]]
@@ -181,8 +640,7 @@ def generate_json_object(download_data):
     }
 
     filter_types = [
-        "value" if "in" in filter_name else "numeric"
-        for filter_name in data_dict["selected_filters"]
+        get_filter_type(filter_name) for filter_name in data_dict["selected_filters"]
     ]
 
     cleanup_filters = [
@@ -206,17 +664,189 @@ def datetime_to_str(date):
     return date.strftime("%Y-%m-%d")
 
 
-def download_data(download_args):
+def _downcast_integers(series):
+    # Stop at int32 so sums and differences of small counts cannot overflow
+    if series.dtype.itemsize <= 4:
+        return series
+    downcast = pd.to_numeric(series, downcast="integer")
+    if downcast.dtype.itemsize < 4:
+        return downcast.astype(np.int32)
+    return series if downcast.dtype == series.dtype else downcast
+
+
+def _to_category(series, category_max_ratio):
+    if series.nunique() > category_max_ratio * len(series):
+        return series
+    categorical = series.astype("category")
+    # Only keep the conversion when it actually saves memory
+    if categorical.memory_usage(deep=True) < series.memory_usage(deep=True):
+        return categorical
+    return series
+
+
+def optimize_column(series, category_max_ratio=category_max_ratio):
+    if is_bool_dtype(series.dtype):
+        return series
+    if is_integer_dtype(series.dtype) and isinstance(series.dtype, np.dtype):
+        return _downcast_integers(series)
+    if series.dtype == np.float64:
+        # Only integral values are downcast, so exports keep the same text
+        values = series.to_numpy()
+        finite = values[np.isfinite(values)]
+        if np.all(finite == np.round(finite)) and np.all(np.abs(finite) <= 2**24):
+            return series.astype(np.float32)
+        return series
+    if is_float_dtype(series.dtype):
+        return series
+    if (
+        series.dtype == object or isinstance(series.dtype, pd.StringDtype)
+    ) and infer_dtype(series, skipna=True) == "string":
+        return _to_category(series, category_max_ratio)
+    return series
+
+
+def optimize_dtypes(df, category_max_ratio=category_max_ratio):
+    """Reduces the memory usage of a dataset without changing its values.
+    Parameters
+    ----------
+    df: pd.DataFrame
+        DataFrame to optimize
+    category_max_ratio: float, default=category_max_ratio
+        String columns with at most this ratio of distinct values to rows are converted to categoricals, if that uses less memory
+    Returns
+    -------
+    pd.DataFrame
+        Optimized copy of df. Integers are downcast to int32 when their values fit (never narrower, so later arithmetic does not overflow), integral floats to float32 and low-cardinality strings to categoricals. A before/after report is stored in `attrs["memory_report"]`. Plots and exports use the original dtypes again (see views.restore_dtypes).
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    optimized = df.copy(deep=False)
+    converted = {}
+    for column in df.columns:
+        series = optimize_column(df[column], category_max_ratio)
+        if series is not df[column]:
+            optimized[column] = series
+            converted[column] = f"{df[column].dtype} -> {series.dtype}"
+    after = int(optimized.memory_usage(deep=True).sum())
+    optimized.attrs["memory_report"] = {
+        "before_bytes": before,
+        "after_bytes": after,
+        "converted_columns": converted,
+    }
+    logging.info(
+        "Optimized dataset memory from %.1f MB to %.1f MB",
+        before / 1024**2,
+        after / 1024**2,
+    )
+    return optimized
+
+
+@profiled("fetch")
+def fetch_data(
+    download_args,
+    cache=None,
+    refresh=False,
+    refresh_recent=False,
+    workers=download_workers,
+    progress=None,
+    cancel=None,
+):
+    if download_args["countries"] or download_args["regions"]:
+        if progress is not None:
+            progress(0, 1, 0, 0)
+        # get_country_api_data extends the countries list in place, so pass copies
+        data = get_country_api_data(
+            **{
+                **download_args,
+                "countries": list(download_args["countries"]),
+                "regions": list(download_args["regions"]),
+            }
+        )
+        if progress is not None:
+            progress(1, 1, len(data), 0)
+        return data
+    no_country_args = {
+        arg: value
+        for arg, value in download_args.items()
+        if arg != "countries" and arg != "regions"
+    }
+    if cache is None and workers <= 1:
+        # Same as go_utils.get_api_data, but honours GLOBE_API_URL (see standin.py)
+        return fetch_whole_range(**no_country_args, progress=progress, cancel=cancel)
+    return fetch_partitioned_data(
+        **no_country_args,
+        cache=cache,
+        refresh=refresh,
+        refresh_recent=refresh_recent,
+        workers=workers,
+        progress=progress,
+        cancel=cancel,
+    )
+
+
+@profiled("download")
+def download_data(
+    download_args,
+    cache=dataset_cache,
+    refresh=False,
+    refresh_recent=False,
+    workers=download_workers,
+    optimize=True,
+    progress=None,
+    cancel=None,
+):
+    """Downloads GLOBE data, reusing previously downloaded datasets when possible.
+    Parameters
+    ----------
+    download_args: dict
+        Protocol, start_date, end_date, countries and regions of the request
+    cache: DatasetCache, default=dataset_cache
+        On-disk cache to load from and store to. Caching is disabled if None. Requests without countries or regions that overlap recent months are only cached as date partitions.
+    refresh: bool, default=False
+        Whether to ignore cached copies and download all of the data again
+    refresh_recent: bool, default=False
+        Whether to download recent, still-changing date partitions again while reusing historic ones
+    workers: int, default=download_workers
+        Number of date partitions downloaded concurrently. With no cache and a single worker the whole range is downloaded in one request.
+    optimize: bool, default=True
+        Whether to reduce the memory usage of the data with optimize_dtypes
+    progress: callable, default=None
+        Called as progress(completed, total, rows, nbytes) after every downloaded date partition (see fetching.fetch_partitioned_data)
+    cancel: threading.Event, default=None
+        Stops the download with fetching.DownloadCancelled once set
+    Returns
+    -------
+    pd.DataFrame
+        The requested GLOBE data. Freshly downloaded data is returned as stored by the cache, i.e. memory-mapped with its "arrow" storage.
+    """
     if type(download_args["start_date"]) is not str:
         download_args["start_date"] = datetime_to_str(download_args["start_date"])
     if type(download_args["end_date"]) is not str:
         download_args["end_date"] = datetime_to_str(download_args["end_date"])
-    if download_args["countries"] or download_args["regions"]:
-        return get_country_api_data(**download_args)
-    else:
-        no_country_args = {
-            key: value
-            for key, value in download_args.items()
-            if key != "countries" and key != "regions"
-        }
-        return get_api_data(**no_country_args)
+
+    key = dataset_key(**download_args)
+    # Ranges reaching into recent months are assembled from their partitions instead,
+    # so their recent partitions expire after recent_partition_ttl
+    partitioned = not (download_args["countries"] or download_args["regions"])
+    recent = partitioned and is_recent_range(
+        download_args["start_date"], download_args["end_date"]
+    )
+    whole_request = cache is not None and not recent
+    if whole_request and not (refresh or refresh_recent):
+        with span("cache lookup"):
+            data = cache.get(key)
+        if data is not None:
+            return data
+
+    data = fetch_data(
+        download_args, cache, refresh, refresh_recent, workers, progress, cancel
+    )
+    # Country downloads cannot be interrupted, their result is discarded instead
+    if cancel is not None and cancel.is_set():
+        raise DownloadCancelled()
+    if optimize:
+        with span("optimize dtypes"):
+            data = optimize_dtypes(data)
+    if whole_request:
+        with span("cache store"):
+            data = cache.put(key, data)
+    return data
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+
+class RowView:
+    """Rows of a DataFrame selected by their positions, without copying them.
+
+    Columns are only copied when they are read, e.g. for widgets, and the selected rows
+    are only copied as a whole when a DataFrame is needed (see materialize).
+    """
+
+    def __init__(self, data, positions):
+        self.data = data
+        self.positions = np.asarray(positions, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def columns(self):
+        return self.data.columns
+
+    def __getitem__(self, column):
+        """Returns the values of a column in the selected rows."""
+        return self.data[column].take(self.positions)
+
+    def take(self, indices):
+        """Copies the rows at the given positions of the view into a DataFrame."""
+        return self.data.take(self.positions[indices])
+
+    def to_frame(self):
+        """Copies the selected rows into a DataFrame."""
+        return self.data.take(self.positions)
+
+
+def materialize(data):
+    """Returns data as a DataFrame, copying the rows of a RowView."""
+    return data.to_frame() if isinstance(data, RowView) else data
+
+
+def restore_dtypes(df):
+    """Returns df with the dtypes its columns had before utils.optimize_dtypes.
+
+    Plots and exports use the original dtypes, so e.g. categories removed by filters
+    are not plotted and exported schemas do not depend on the optimization. GLOBE
+    data has no narrow numeric columns of its own, so float32 columns are restored to
+    float64 and narrow integers to int64.
+    """
+    restored = {}
+    for column, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            restored[column] = dtype.categories.dtype
+        elif dtype == np.float32:
+            restored[column] = np.float64
+        elif dtype in (np.int8, np.int16, np.int32):
+            restored[column] = np.int64
+    return df.astype(restored) if restored else df